@@ -0,0 +1,150 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Diretório do blob store (em produção, um volume compartilhado pelos workers)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "data/blobs")
+
+# Referência guardada em Course.wallpaper no lugar da imagem: "blob:<sha256>.<ext>"
+BLOB_REF_PREFIX = "blob:"
+
+# Assina as URLs das capas: <img src> não manda o header Authorization
+WALLPAPER_URL_SECRET = os.getenv("WALLPAPER_URL_SECRET") or os.getenv("SECRET_KEY", "")
+
+# Abaixo disso não vale tentar decodificar (descrições de capa, URLs)
+MIN_BASE64_LENGTH = 256
+
+IMAGE_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+_BLOB_NAME = re.compile(r"^[0-9a-f]{64}\.(png|jpg|gif|webp)$")
+
+
+def _image_extension(data: bytes) -> Optional[str]:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def decode_image(value: str):
+    """
+    (bytes, extensão) se o valor for uma imagem em base64 (com ou sem
+    prefixo data:), ou None para texto comum
+    """
+    if not value or len(value) < MIN_BASE64_LENGTH:
+        return None
+    if value.startswith("data:"):
+        header, _, value = value.partition(",")
+        if ";base64" not in header:
+            return None
+    try:
+        data = base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+    extension = _image_extension(data)
+    if extension is None:
+        return None
+    return data, extension
+
+
+class BlobStore:
+    """
+    Arquivos endereçados pelo sha256 do conteúdo: o mesmo conteúdo é gravado
+    uma única vez e nunca muda, então pode ser cacheado para sempre
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        # Dois níveis de diretório para não acumular milhares de arquivos num só
+        return os.path.join(self.root, name[:2], name[2:4], name)
+
+    def put(self, data: bytes, extension: str) -> str:
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self.path(name)
+        if os.path.exists(path):
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escreve num temporário e renomeia: leitores nunca veem arquivo pela metade
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def get_path(self, name: str) -> Optional[str]:
+        if not _BLOB_NAME.match(name):
+            return None
+        path = self.path(name)
+        return path if os.path.exists(path) else None
+
+
+# Instância global do blob store
+blob_store = BlobStore(BLOB_STORE_DIR)
+
+
+def store_wallpaper(value: str) -> str:
+    """
+    Grava a capa em base64 no blob store e devolve a referência;
+    outros valores (descrição, URL, vazio) ficam como estão
+    """
+    image = decode_image(value)
+    if image is None:
+        return value
+    data, extension = image
+    return BLOB_REF_PREFIX + blob_store.put(data, extension)
+
+
+def wallpaper_blob(value: Optional[str]) -> Optional[str]:
+    """
+    Nome do blob referenciado em Course.wallpaper, se houver
+    """
+    if value and value.startswith(BLOB_REF_PREFIX):
+        return value[len(BLOB_REF_PREFIX):]
+    return None
+
+
+def wallpaper_signature(course_id: int, name: str) -> str:
+    message = f"{course_id}:{name}".encode()
+    return hmac.new(WALLPAPER_URL_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def valid_wallpaper_signature(course_id: int, name: str, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(signature, wallpaper_signature(course_id, name))
+
+
+def wallpaper_url(course_id: int, name: str) -> str:
+    # A versão muda junto com o conteúdo, então a URL pode ser cacheada como imutável.
+    # A assinatura não expira: a URL vai no JSON pré-serializado do curso e só
+    # dá acesso a esta capa deste curso
+    return f"/courses/{course_id}/wallpaper?v={name[:16]}&sig={wallpaper_signature(course_id, name)}"
+
+
+def media_type(name: str) -> str:
+    return IMAGE_TYPES[name.rsplit(".", 1)[1]]
@@ -0,0 +1,131 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from . import models, utils
+from .database import AsyncSessionLocal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Reservas sem confirmação nem renovação por esse tempo são devolvidas pelo sweeper
+CREDIT_RESERVATION_TTL = float(os.getenv("CREDIT_RESERVATION_TTL", 3600))
+
+# Custo de regerar parte de um curso (um curso completo custa 1 crédito)
+MODULE_REGENERATION_COST = float(os.getenv("MODULE_REGENERATION_COST", 0.3))
+LESSON_REGENERATION_COST = float(os.getenv("LESSON_REGENERATION_COST", 0.05))
+TRANSLATION_COST = float(os.getenv("TRANSLATION_COST", 0.3))  # Traduzir um curso inteiro
+
+RESERVED = "reserved"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+async def reserve(db: AsyncSession, user_id: int, amount: float = 1, job_id: str = None):
+    """
+    Debita `amount` créditos com um UPDATE condicional (sem read-modify-write)
+    e registra a reserva. Retorna None se o saldo for insuficiente.
+    Não faz commit: o débito entra na transação de quem chamou
+    """
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.credits >= amount)
+        .values(credits=models.User.credits - amount)
+    )
+    if result.rowcount != 1:
+        return None
+    utils.invalidate_user_on_commit(db, user_id)
+
+    reservation = models.CreditReservation(
+        user_id=user_id,
+        amount=amount,
+        job_id=job_id,
+        expires_at=_utcnow() + timedelta(seconds=CREDIT_RESERVATION_TTL)
+    )
+    db.add(reservation)
+    await db.flush()
+    return reservation
+
+
+async def commit_reservation(db: AsyncSession, reservation_id: str) -> bool:
+    """
+    Confirma a reserva (o crédito foi de fato consumido)
+    """
+    result = await db.execute(
+        update(models.CreditReservation)
+        .where(models.CreditReservation.id == reservation_id, models.CreditReservation.status == RESERVED)
+        .values(status=COMMITTED)
+    )
+    return result.rowcount == 1
+
+
+async def release_reservation(db: AsyncSession, reservation_id: str) -> bool:
+    """
+    Devolve os créditos da reserva. Idempotente: só a primeira chamada reembolsa
+    """
+    reservation = await db.get(models.CreditReservation, reservation_id)
+    if reservation is None:
+        return False
+
+    result = await db.execute(
+        update(models.CreditReservation)
+        .where(models.CreditReservation.id == reservation_id, models.CreditReservation.status == RESERVED)
+        .values(status=RELEASED)
+    )
+    if result.rowcount != 1:
+        return False
+
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == reservation.user_id)
+        .values(credits=models.User.credits + reservation.amount)
+    )
+    utils.invalidate_user_on_commit(db, reservation.user_id)
+    return True
+
+
+async def extend_reservation(db: AsyncSession, reservation_id: str):
+    await db.execute(
+        update(models.CreditReservation)
+        .where(models.CreditReservation.id == reservation_id, models.CreditReservation.status == RESERVED)
+        .values(expires_at=_utcnow() + timedelta(seconds=CREDIT_RESERVATION_TTL))
+    )
+
+
+async def sweep_expired_reservations() -> int:
+    """
+    Devolve os créditos de reservas expiradas (ex.: o worker morreu no meio da geração)
+    e marca como falhos os jobs que ainda dependiam delas
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.CreditReservation.id).where(
+            models.CreditReservation.status == RESERVED,
+            models.CreditReservation.expires_at < _utcnow()
+        ))
+        expired = result.scalars().all()
+
+    released = 0
+    for reservation_id in expired:
+        async with AsyncSessionLocal() as db:
+            if await release_reservation(db, reservation_id):
+                await db.execute(
+                    update(models.GenerationJob)
+                    .where(
+                        models.GenerationJob.reservation_id == reservation_id,
+                        models.GenerationJob.status.in_(["queued", "running"])
+                    )
+                    .values(status="failed", error="Reserva de créditos expirada. Tente novamente.", updated_at=_utcnow())
+                )
+                released += 1
+            await db.commit()
+
+    if released:
+        logger.warning("%d reservas de crédito expiradas foram devolvidas", released)
+    return released
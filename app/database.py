@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,24 +9,51 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
+def _async_url(url: str) -> str:
+    """
+    Troca o driver síncrono pelo equivalente assíncrono
+    (asyncpg para Postgres, aiosqlite para SQLite local/testes)
+    """
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+# URL do engine assíncrono; por padrão derivada de DATABASE_URL
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(SQLALCHEMY_DATABASE_URL)
+
 # Configuração melhorada do engine com pool de conexões
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
+POOL_OPTIONS = dict(
     pool_size=20,  # Número de conexões no pool
     max_overflow=30,  # Conexões adicionais que podem ser criadas
     pool_pre_ping=True,  # Verifica se a conexão ainda está válida
     pool_recycle=3600,  # Recicla conexões a cada hora
     pool_timeout=30,  # Timeout para obter conexão do pool
+)
+
+# Engine síncrono: usado por create_all, migrações e scripts
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    **POOL_OPTIONS,
     echo=False  # Set to True para debug SQL
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono: usado pelas rotas e pelos workers de geração
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **({} if ASYNC_DATABASE_URL.startswith("sqlite") else POOL_OPTIONS),
+    echo=False
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,686 @@
+import json
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from dotenv import load_dotenv
+from . import schemas, models, blobs
+from .cache import TTLCache
+from .json_repair import repair_json
+from .llm import LLMClient, get_llm_client
+from .hedging import hedger
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Timeout máximo para uma geração completa (5 minutos)
+GENERATION_TIMEOUT = 300
+
+# "single": um único prompt com o curso inteiro
+# "fanout": esboço primeiro, depois módulos e questionário em chamadas paralelas
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", 4))  # Chamadas simultâneas por curso no modo fanout
+GENERATION_SECTION_RETRIES = int(os.getenv("GENERATION_SECTION_RETRIES", 2))  # Novas tentativas por seção
+
+COURSE_MODULES = 3  # Módulos pedidos nos prompts
+QUIZ = "quiz"  # Seção do resumo final e questionário; módulos são identificados pelo índice
+
+# Cache de conteúdo gerado, indexado pelo hash normalizado do pedido
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", 256))  # 0 desliga o cache
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", 86400))
+
+generation_cache = TTLCache(max_size=GENERATION_CACHE_SIZE, ttl=GENERATION_CACHE_TTL)
+
+
+# Orientações compartilhadas entre o prompt completo e os prompts por seção
+LESSON_WRITING_GUIDELINES = """## ORIENTAÇÕES PARA AS AULAS
+
+### 1. Início da Aula
+- Comece **diretamente com o conteúdo**.
+- **Proibido** o uso de frases introdutórias como: "Nesta aula veremos", "Agora que já estudamos...", ou similares.
+
+### 2. Desenvolvimento
+- Apresente o conceito central com profundidade
+- Contextualize com aplicações práticas
+- Conecte com o que foi aprendido nos módulos anteriores
+- Inclua explicações claras, comparações, estudos de caso e dicas
+- Evite explicações genéricas ou superficiais
+
+### 3. Estrutura HTML
+Use HTML organizado e visualmente agradável:
+
+- `<strong style="display:block; margin-top:1.5rem; margin-bottom:1.5rem;">`: para subtópicos internos visuais  
+- `<ul>` e `<li>`: quando for listar pontos ou enumerar itens
+- `<code>` ou `<pre>`: para comandos, trechos técnicos ou sintaxes  
+- `<strong>` e `<em>`: para destaques importantes em frases  
+- `<p>`: apenas para parágrafos (nunca encapsule tudo em um único `<p>`)  
+- `<br>`: para quebras de linha pontuais onde necessário  
+
+### 4. Exemplos e Analogias
+- Sempre que possível, inclua **exemplos reais e contextualizados**
+- Use analogias para facilitar a compreensão de tópicos mais abstratos"""
+
+LESSON_GUIDELINES = LESSON_WRITING_GUIDELINES + """
+
+---
+
+## EXERCÍCIOS PRÁTICOS
+
+- Ao final de cada módulo (ou em uma aula estratégica), inclua uma **atividade prática** com **150 a 160 palavras** em HTML
+- Tipos de atividade: exercícios, estudo de caso ou quiz rápido
+- Sempre que possível, forneça gabarito ou sugestão de resposta comentada"""
+
+SUMMARY_AND_QUIZ_GUIDELINES = """## RESUMO FINAL DO CURSO
+
+- Escreva um **resumo com cerca de 150 palavras**, em HTML
+- Recapitule os principais pontos e aprendizados
+
+---
+
+## QUESTIONÁRIO FINAL
+
+- Elabore **10 perguntas de múltipla escolha**
+- Cada pergunta deve conter **4 alternativas**, com **apenas uma correta**
+- Use linguagem clara, objetiva e alinhada com o conteúdo ensinado"""
+
+
+def build_course_prompt(course_request: schemas.CourseRequest) -> str:
+    """
+    Monta o prompt de geração do curso completo
+    """
+    return f"""
+Você é um assistente educacional com ampla experiência em design instrucional, criação de cursos online e ensino técnico no tema **{course_request.topic}**.
+
+Sua tarefa é gerar um curso completo em **{course_request.language}**, com estrutura progressiva, clareza didática, e conteúdo aprofundado. Use o tom de voz: **{course_request.voice_tone}**.
+
+Geração de Imagem de Capa: {'Sim' if course_request.generate_cover_image else 'Não'}  
+Se 'Sim', crie uma descrição coerente com o tema. Caso contrário, ignore essa instrução.
+
+---
+
+## INSTRUÇÕES GERAIS DO CURSO
+
+**Título:** Use [{course_request.topic}], corrigindo erros de escrita, se necessário.  
+**Subtítulo:** Crie um subtítulo conciso e cativante, destacando escopo ou benefício do curso.  
+**Imagem de capa:** Se aplicável, gere uma descrição coerente e relevante.
+
+---
+
+## ESTRUTURA DO CURSO
+
+- O curso deve conter **3 módulos sequenciais**, com dificuldade crescente.
+- Cada módulo deve conter:
+  - `"module_title"`: Um nome claro e descritivo
+  - `"chapter"`: Uma palavra curta (1 palavra) que represente o módulo (para menu lateral)
+  - **6 aulas**, com títulos relevantes e conteúdo técnico crescente
+- Cada aula deve ter:
+  - `"lesson_title"`: Um título direto e informativo
+  - `"content"`: HTML entre **300 e 400 palavras**, estruturado, com ensino progressivo e detalhado.
+
+---
+
+{LESSON_GUIDELINES}
+
+---
+
+{SUMMARY_AND_QUIZ_GUIDELINES}
+
+---
+
+## FORMATO DE SAÍDA
+
+A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
+
+{{
+  "title": "<Título do Curso>",
+  "subtitle": "<Subtítulo do Curso>",
+  "wallpaper": "<Base64 ou string vazia>",
+  "modules": [
+    {{
+      "module_title": "Título do Módulo",
+      "chapter": "NomeDoCapitulo",
+      "lessons": [
+        {{
+          "lesson_title": "Título da Aula",
+          "content": "<Conteúdo da aula em HTML, com estrutura progressiva e exemplos práticos>"
+        }}
+        ...
+      ],
+      "practice_activities": [
+        {{
+          "title": "Título da Atividade",
+          "content": "<Conteúdo em HTML>"
+        }}
+      ]
+    }}
+    ...
+  ],
+  "final_summary": {{
+    "title": "Resumo Final",
+    "content": "<Resumo do curso em HTML>"
+  }},
+  "assessment_quiz": [
+    {{
+      "text": "Pergunta 1?",
+      "alternatives": [
+        {{ "text": "Alternativa A", "is_correct": false }},
+        {{ "text": "Alternativa B", "is_correct": true }},
+        {{ "text": "Alternativa C", "is_correct": false }},
+        {{ "text": "Alternativa D", "is_correct": false }}
+      ]
+    }}
+    ...
+  ]
+}}
+
+---
+
+**IMPORTANTE:**  
+- Responda apenas com o JSON acima.  
+- Não inclua comentários, explicações ou textos adicionais.  
+- Preencha todos os campos com conteúdo real e coerente.  
+- O campo `"title"` é obrigatório.
+"""
+
+
+def _course_header(course_request: schemas.CourseRequest) -> str:
+    return f"""
+Você é um assistente educacional com ampla experiência em design instrucional, criação de cursos online e ensino técnico no tema **{course_request.topic}**.
+
+O curso é escrito em **{course_request.language}**, nível **{course_request.depth_level}**, com estrutura progressiva, clareza didática e conteúdo aprofundado. Use o tom de voz: **{course_request.voice_tone}**.
+"""
+
+
+def _outline_text(outline: dict, lessons_of: int = None) -> str:
+    """
+    Esboço em texto para os prompts; com lessons_of, só aquele módulo lista
+    os títulos das aulas
+    """
+    lines = [f"Curso: {outline['title']} — {outline['subtitle']}"]
+    for index, module in enumerate(outline["modules"]):
+        lines.append(f"Módulo {index + 1}: {module['module_title'] or 'a definir'} ({module['chapter'] or 'a definir'})")
+        if lessons_of is None or lessons_of == index:
+            for lesson_title in module["lesson_titles"]:
+                lines.append(f"  - {lesson_title}")
+    return "\n".join(lines)
+
+
+def _module_outline(module) -> dict:
+    # Títulos de um módulo gerado (válido ou não) no formato do esboço
+    module = module if isinstance(module, dict) else {}
+    lessons = module.get("lessons") if isinstance(module.get("lessons"), list) else []
+    return {
+        "module_title": module.get("module_title") if isinstance(module.get("module_title"), str) else "",
+        "chapter": module.get("chapter") if isinstance(module.get("chapter"), str) else "",
+        "lesson_titles": [
+            lesson["lesson_title"] for lesson in lessons
+            if isinstance(lesson, dict) and isinstance(lesson.get("lesson_title"), str)
+        ],
+    }
+
+
+def course_outline(title: str, subtitle: str, modules: list) -> dict:
+    """
+    Esboço de um curso já gerado, usado como contexto para refazer partes dele
+    """
+    return {"title": title, "subtitle": subtitle, "modules": [_module_outline(module) for module in modules]}
+
+
+def build_outline_prompt(course_request: schemas.CourseRequest) -> str:
+    """
+    Monta o prompt do esboço do curso (títulos de módulos e aulas, sem conteúdo)
+    """
+    return _course_header(course_request) + f"""
+Sua tarefa agora é apenas planejar o curso, sem escrever o conteúdo das aulas.
+
+Geração de Imagem de Capa: {'Sim' if course_request.generate_cover_image else 'Não'}  
+Se 'Sim', crie uma descrição coerente com o tema. Caso contrário, deixe o campo vazio.
+
+- **Título:** Use [{course_request.topic}], corrigindo erros de escrita, se necessário.
+- **Subtítulo:** Conciso e cativante, destacando escopo ou benefício do curso.
+- **3 módulos sequenciais**, com dificuldade crescente, cada um com `"chapter"` de uma palavra e **6 títulos de aulas**.
+
+A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
+
+{{
+  "title": "<Título do Curso>",
+  "subtitle": "<Subtítulo do Curso>",
+  "wallpaper": "<Descrição da capa ou string vazia>",
+  "modules": [
+    {{
+      "module_title": "Título do Módulo",
+      "chapter": "NomeDoCapitulo",
+      "lesson_titles": ["Título da Aula", ...]
+    }}
+    ...
+  ]
+}}
+"""
+
+
+def build_module_prompt(course_request: schemas.CourseRequest, outline: dict, module_index: int) -> str:
+    """
+    Monta o prompt das aulas e atividades práticas de um módulo do esboço
+    """
+    module = outline["modules"][module_index]
+    if module["lesson_titles"]:
+        lesson_titles = "\n".join(f"- {title}" for title in module["lesson_titles"])
+        lessons = f"com as aulas abaixo, nesta ordem:\n\n{lesson_titles}"
+    else:
+        # Módulo sem esboço (ex.: resposta cortada antes dele): a IA escolhe os títulos
+        lessons = "com **6 aulas**, com títulos relevantes e conteúdo técnico crescente."
+
+    return _course_header(course_request) + f"""
+O esboço completo do curso é:
+
+{_outline_text(outline)}
+
+Sua tarefa é escrever **somente o Módulo {module_index + 1}: {module['module_title'] or 'título a definir'}**, {lessons}
+
+Cada aula deve ter `"content"` em HTML entre **300 e 400 palavras**, estruturado, com ensino progressivo e detalhado.
+
+{LESSON_GUIDELINES}
+
+---
+
+A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
+
+{{
+  "module_title": "{module['module_title'] or 'Título do Módulo'}",
+  "chapter": "{module['chapter'] or 'NomeDoCapitulo'}",
+  "lessons": [
+    {{
+      "lesson_title": "Título da Aula",
+      "content": "<Conteúdo da aula em HTML>"
+    }}
+    ...
+  ],
+  "practice_activities": [
+    {{
+      "title": "Título da Atividade",
+      "content": "<Conteúdo em HTML>"
+    }}
+  ]
+}}
+"""
+
+
+def build_lesson_prompt(course_request: schemas.CourseRequest, outline: dict, module_index: int, lesson_index: int) -> str:
+    """
+    Monta o prompt de uma única aula: o esboço com os títulos dos módulos e
+    só as aulas vizinhas do mesmo módulo
+    """
+    lesson_titles = outline["modules"][module_index]["lesson_titles"]
+    lesson_title = lesson_titles[lesson_index]
+    neighbours = []
+    if lesson_index > 0:
+        neighbours.append(f"A aula anterior é **{lesson_titles[lesson_index - 1]}**.")
+    if lesson_index + 1 < len(lesson_titles):
+        neighbours.append(f"A aula seguinte é **{lesson_titles[lesson_index + 1]}**.")
+
+    return _course_header(course_request) + f"""
+O esboço do curso é:
+
+{_outline_text(outline, lessons_of=module_index)}
+
+Sua tarefa é escrever **somente a Aula {lesson_index + 1} do Módulo {module_index + 1}: {lesson_title}**. {" ".join(neighbours)}
+
+A aula deve ter `"content"` em HTML entre **300 e 400 palavras**, estruturado, com ensino progressivo e detalhado, sem repetir o conteúdo das aulas vizinhas.
+
+{LESSON_WRITING_GUIDELINES}
+
+---
+
+A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
+
+{{
+  "lesson_title": "{lesson_title}",
+  "content": "<Conteúdo da aula em HTML>"
+}}
+"""
+
+
+def build_quiz_prompt(course_request: schemas.CourseRequest, outline: dict) -> str:
+    """
+    Monta o prompt do resumo final e do questionário a partir do esboço
+    """
+    return _course_header(course_request) + f"""
+O esboço completo do curso é:
+
+{_outline_text(outline)}
+
+Sua tarefa é escrever **somente o resumo final e o questionário** do curso.
+
+{SUMMARY_AND_QUIZ_GUIDELINES}
+
+---
+
+A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
+
+{{
+  "final_summary": {{
+    "title": "Resumo Final",
+    "content": "<Resumo do curso em HTML>"
+  }},
+  "assessment_quiz": [
+    {{
+      "text": "Pergunta 1?",
+      "alternatives": [
+        {{ "text": "Alternativa A", "is_correct": false }},
+        {{ "text": "Alternativa B", "is_correct": true }},
+        {{ "text": "Alternativa C", "is_correct": false }},
+        {{ "text": "Alternativa D", "is_correct": false }}
+      ]
+    }}
+    ...
+  ]
+}}
+"""
+
+
+def _parser(schema):
+    # Com hedging, só uma resposta que passa aqui encerra a disputa
+    def parse(response_text: str) -> dict:
+        data, truncated = repair_json(response_text)
+        if truncated:
+            # Uma seção cortada pode validar com menos itens; é melhor pedir de novo
+            raise ValueError("resposta da IA incompleta")
+        return schema.model_validate(data).model_dump()
+    return parse
+
+
+def _parse_course(response_text: str) -> tuple:
+    """
+    Parse tolerante do curso completo: aceita seções inválidas, que
+    repair_course refaz depois. Só falha se não houver um objeto JSON
+    """
+    data, truncated = repair_json(response_text)
+    if not isinstance(data, dict):
+        raise ValueError("a resposta da IA não é um objeto JSON")
+    return data, truncated
+
+
+def _last_section(data: dict):
+    """
+    Seção em que uma resposta cortada parou (a última chave escrita)
+    """
+    last_key = next(reversed(data), None)
+    if last_key in ("final_summary", "assessment_quiz"):
+        return QUIZ
+    modules = data.get("modules")
+    if last_key == "modules" and isinstance(modules, list) and modules:
+        return len(modules) - 1
+    return None
+
+
+def _validate(schema, value):
+    try:
+        return schema.model_validate(value).model_dump()
+    except ValueError:
+        return None
+
+
+async def repair_course(client: LLMClient, course_request: schemas.CourseRequest, data: dict, incomplete=()) -> tuple:
+    """
+    Valida o curso seção por seção (cada módulo e o resumo + questionário) e
+    gera de novo só as que falharam, a partir do esboço salvo do próprio
+    curso. incomplete força seções a serem refeitas (ex.: onde a resposta foi
+    cortada). Retorna (curso validado, seções refeitas)
+    """
+    raw_modules = data.get("modules") if isinstance(data.get("modules"), list) else []
+    modules = [
+        None if index in incomplete else _validate(schemas.CourseContentModule, module)
+        for index, module in enumerate(raw_modules)
+    ]
+    modules += [None] * (COURSE_MODULES - len(modules))
+    quiz = None if QUIZ in incomplete else _validate(schemas.CourseContentQuizSection, {
+        "final_summary": data.get("final_summary"),
+        "assessment_quiz": data.get("assessment_quiz"),
+    })
+
+    failed = [index for index, module in enumerate(modules) if module is None]
+    if quiz is None:
+        failed.append(QUIZ)
+
+    title = data.get("title") if isinstance(data.get("title"), str) else course_request.topic
+    subtitle = data.get("subtitle") if isinstance(data.get("subtitle"), str) else ""
+    wallpaper = data.get("wallpaper") if isinstance(data.get("wallpaper"), str) else ""
+
+    if not failed:
+        return _course(title, subtitle, wallpaper, modules, quiz), failed
+
+    outline = course_outline(title, subtitle, [
+        modules[index] or (raw_modules[index] if index < len(raw_modules) else None)
+        for index in range(len(modules))
+    ])
+
+    if not any(module["module_title"] for module in outline["modules"]):
+        # Nada do esboço se aproveita: gera o curso por seções, começando pelo esboço
+        logger.warning("Resposta da IA sem nenhum módulo aproveitável; gerando por seções")
+        course = await _generate_fanout(client, course_request)
+        return course, list(range(len(course["modules"]))) + [QUIZ]
+
+    logger.warning("Resposta da IA com seções inválidas; refazendo só %s", failed)
+    semaphore = asyncio.Semaphore(GENERATION_CONCURRENCY)
+    sections = [
+        _generate_section(client, "questionário", "quiz", build_quiz_prompt(course_request, outline), schemas.CourseContentQuizSection, semaphore)
+        if section == QUIZ else
+        _generate_section(client, f"módulo {section + 1}", "module", build_module_prompt(course_request, outline, section), schemas.CourseContentModule, semaphore)
+        for section in failed
+    ]
+    for section, result in zip(failed, await gather_or_cancel(*sections)):
+        if section == QUIZ:
+            quiz = result
+        else:
+            modules[section] = result
+    return _course(title, subtitle, wallpaper, modules, quiz), failed
+
+
+def _course(title: str, subtitle: str, wallpaper: str, modules: list, quiz: dict) -> dict:
+    course = schemas.CourseContent(
+        title=title,
+        subtitle=subtitle,
+        wallpaper=wallpaper,
+        modules=modules,
+        final_summary=quiz["final_summary"],
+        assessment_quiz=quiz["assessment_quiz"]
+    )
+    return course.model_dump()
+
+
+async def _generate_single(client: LLMClient, course_request: schemas.CourseRequest) -> dict:
+    data, truncated = await hedger.run("course", client, build_course_prompt(course_request), _parse_course)
+    course, _ = await repair_course(client, course_request, data, [_last_section(data)] if truncated else ())
+    return course
+
+
+async def gather_or_cancel(*coros) -> list:
+    """
+    Como asyncio.gather, mas a primeira falha cancela as chamadas irmãs
+    ainda em andamento (sem gastar tokens num curso que já falhou) e é
+    relançada como veio
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _generate_section(client: LLMClient, name: str, kind: str, prompt: str, schema, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Gera uma seção do curso, repetindo só ela em caso de resposta inválida
+    """
+    for attempt in range(GENERATION_SECTION_RETRIES + 1):
+        try:
+            async with semaphore:
+                return await hedger.run(kind, client, prompt, _parser(schema))
+        except (json.JSONDecodeError, ValueError) as e:
+            if attempt == GENERATION_SECTION_RETRIES:
+                raise
+            logger.warning("Seção %s inválida (tentativa %d): %s", name, attempt + 1, e)
+
+
+async def _generate_fanout(client: LLMClient, course_request: schemas.CourseRequest) -> dict:
+    semaphore = asyncio.Semaphore(GENERATION_CONCURRENCY)
+    outline = await _generate_section(client, "esboço", "outline", build_outline_prompt(course_request), schemas.CourseContentOutline, semaphore)
+
+    module_tasks = [
+        _generate_section(
+            client,
+            f"módulo {index + 1}",
+            "module",
+            build_module_prompt(course_request, outline, index),
+            schemas.CourseContentModule,
+            semaphore
+        )
+        for index in range(len(outline["modules"]))
+    ]
+    quiz_task = _generate_section(client, "questionário", "quiz", build_quiz_prompt(course_request, outline), schemas.CourseContentQuizSection, semaphore)
+
+    *modules, quiz = await gather_or_cancel(*module_tasks, quiz_task)
+
+    return _course(outline["title"], outline["subtitle"], outline["wallpaper"], modules, quiz)
+
+
+async def generate_course_content(course_request: schemas.CourseRequest) -> dict:
+    """
+    Gera o conteúdo do curso (conforme GENERATION_MODE, com o provedor do
+    pedido ou o padrão) e retorna já convertido em dict
+    """
+    client = get_llm_client(course_request.provider)
+    generate = _generate_fanout if GENERATION_MODE == "fanout" else _generate_single
+    return await asyncio.wait_for(generate(client, course_request), timeout=GENERATION_TIMEOUT)
+
+
+async def regenerate_module(client: LLMClient, course_request: schemas.CourseRequest, outline: dict, module_index: int) -> dict:
+    """
+    Gera de novo um módulo (mesmos títulos de aulas) com o esboço do curso como contexto
+    """
+    prompt = build_module_prompt(course_request, outline, module_index)
+    section = _generate_section(client, f"módulo {module_index + 1}", "module", prompt, schemas.CourseContentModule, asyncio.Semaphore(1))
+    return await asyncio.wait_for(section, timeout=GENERATION_TIMEOUT)
+
+
+async def regenerate_lesson(client: LLMClient, course_request: schemas.CourseRequest, outline: dict, module_index: int, lesson_index: int) -> dict:
+    """
+    Gera de novo o conteúdo de uma aula, mantendo o título
+    """
+    prompt = build_lesson_prompt(course_request, outline, module_index, lesson_index)
+    name = f"aula {lesson_index + 1} do módulo {module_index + 1}"
+    lesson = await asyncio.wait_for(
+        _generate_section(client, name, "lesson", prompt, schemas.CourseContentLesson, asyncio.Semaphore(1)),
+        timeout=GENERATION_TIMEOUT
+    )
+    lesson["lesson_title"] = outline["modules"][module_index]["lesson_titles"][lesson_index]
+    return lesson
+
+
+async def stream_course_content(course_request: schemas.CourseRequest):
+    """
+    Chama o provedor de IA em modo streaming e devolve os pedaços de texto conforme chegam
+    """
+    client = get_llm_client(course_request.provider)
+    async for text in client.stream(build_course_prompt(course_request)):
+        yield text
+
+
+def build_course(course_data: dict, course_request: schemas.CourseRequest, user_id: int) -> models.Course:
+    """
+    Monta o models.Course a partir do JSON gerado pela IA
+    """
+    course = models.Course(
+        title=course_data["title"],
+        subtitle=course_data["subtitle"],
+        wallpaper=blobs.store_wallpaper(course_data["wallpaper"]),
+        modules=course_data["modules"],
+        final_summary=course_data["final_summary"],
+        assessment_quiz=course_data["assessment_quiz"],
+        language=course_request.language,
+        depth_level=course_request.depth_level,
+        voice_tone=course_request.voice_tone,
+        user_id=user_id
+    )
+    normalize_course(course)
+    return course
+
+
+def normalize_course(course: models.Course):
+    """
+    Preenche as tabelas normalizadas (módulos, aulas e questões) a partir das
+    colunas JSON do curso. O JSON continua sendo a fonte do curso completo
+    """
+    course.module_rows = [
+        models.CourseModule(
+            position=module_index,
+            module_title=module.get("module_title"),
+            chapter=module.get("chapter"),
+            practice_activities=module.get("practice_activities") or [],
+            lessons=[
+                models.CourseLesson(
+                    position=lesson_index,
+                    lesson_title=lesson.get("lesson_title"),
+                    content=lesson.get("content")
+                )
+                for lesson_index, lesson in enumerate(module.get("lessons") or [])
+            ]
+        )
+        for module_index, module in enumerate(course.modules or [])
+    ]
+    course.quiz_question_rows = [
+        models.CourseQuizQuestion(
+            position=question_index,
+            text=question.get("text"),
+            alternatives=question.get("alternatives") or []
+        )
+        for question_index, question in enumerate(course.assessment_quiz or [])
+    ]
+
+
+def _fold(value) -> str:
+    return re.sub(r"\s+", " ", value or "").strip().casefold()
+
+
+def same_language(first: str, second: str) -> bool:
+    return _fold(first) == _fold(second)
+
+
+def request_cache_key(course_request: schemas.CourseRequest) -> str:
+    """
+    Hash do pedido com tema, idioma, nível e tom normalizados
+    (sem diferença de maiúsculas ou espaços)
+    """
+    fields = [
+        _fold(course_request.topic),
+        _fold(course_request.language),
+        _fold(course_request.depth_level),
+        _fold(course_request.voice_tone),
+        bool(course_request.generate_cover_image),
+    ]
+    if course_request.provider:
+        # Provedor escolhido no pedido: não reaproveita conteúdo de outro
+        fields.append(course_request.provider)
+    return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+
+def get_cached_content(course_request: schemas.CourseRequest):
+    """
+    Retorna uma cópia do conteúdo em cache para o pedido, ou None.
+    Pedidos com fresh=true nunca usam o cache
+    """
+    if course_request.fresh:
+        return None
+    cached = generation_cache.get(request_cache_key(course_request))
+    return json.loads(cached) if cached is not None else None
+
+
+def cache_content(course_request: schemas.CourseRequest, course_data: dict):
+    # Guardado serializado para que nenhum curso compartilhe objetos com o cache
+    generation_cache.set(request_cache_key(course_request), json.dumps(course_data, ensure_ascii=False))
+
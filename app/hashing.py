@@ -0,0 +1,93 @@
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+
+load_dotenv()
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Processos dedicados ao bcrypt por worker do uvicorn (0 = usa threads, útil em desenvolvimento)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Operações na fila + em execução antes de responder 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+# Tempo médio estimado de um hash bcrypt, usado no Retry-After
+PASSWORD_HASH_ESTIMATED_SECONDS = float(os.getenv("PASSWORD_HASH_ESTIMATED_SECONDS", 0.3))
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Executa bcrypt num pool de processos limitado, fora do thread pool do
+    Starlette e do GIL do worker. Quando há operações demais pendentes,
+    recusa com 503 + Retry-After em vez de enfileirar sem limite.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            # spawn: os filhos não herdam o event loop nem conexões do worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            retry_after = math.ceil(self.pending * PASSWORD_HASH_ESTIMATED_SECONDS / max(self.workers, 1))
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado. Tente novamente em instantes.",
+                headers={"Retry-After": str(max(retry_after, 1))}
+            )
+
+        self.pending += 1
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+
+# Instância global do executor de senhas
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dotenv import load_dotenv
+from .llm import LLMClient, get_llm_client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Provedor (ou "provedor:modelo") da requisição de reserva; vazio desliga o hedging
+LLM_HEDGE_PROVIDER = os.getenv("LLM_HEDGE_PROVIDER", "")
+# Dispara a reserva quando a principal passa deste percentil da latência observada
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 5))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", 120))
+LLM_HEDGE_INITIAL_DELAY = float(os.getenv("LLM_HEDGE_INITIAL_DELAY", 60))  # Até ter LLM_HEDGE_MIN_SAMPLES amostras
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", 200))  # Amostras de latência guardadas por tipo de prompt
+# Fração máxima de chamadas com reserva, para o hedging não multiplicar a carga
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", 0.1))
+
+PRIMARY = "primary"
+HEDGE = "hedge"
+
+
+class LatencyTracker:
+    """
+    Últimas latências (em segundos) por chave, para percentis baratos
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+
+    def record(self, key, latency: float):
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def count(self, key) -> int:
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key, pct: float):
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def stats(self) -> dict:
+        return {
+            ":".join(key): {
+                "samples": len(samples),
+                "p50": round(self.percentile(key, 0.5), 2),
+                "p95": round(self.percentile(key, 0.95), 2),
+                "p99": round(self.percentile(key, 0.99), 2),
+            }
+            for key, samples in self._samples.items()
+        }
+
+
+class Hedger:
+    """
+    Requisições com reserva: se a principal não termina dentro do percentil
+    observado para aquele tipo de prompt, a mesma requisição vai para o
+    provedor secundário. Vale a primeira resposta que `parse` aceitar; a
+    outra é cancelada
+    """
+
+    def __init__(self, secondary: str = "", percentile: float = 0.95, min_delay: float = 5,
+                 max_delay: float = 120, initial_delay: float = 60, min_samples: int = 20,
+                 window: int = 200, max_rate: float = 0.1):
+        self.secondary = secondary
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.latencies = LatencyTracker(window)
+        self._recent = deque(maxlen=window)  # Se cada chamada recente teve reserva
+        self.requests = 0
+        self.hedged = 0
+        self.skipped = 0  # Passou do atraso, mas o limite de LLM_HEDGE_MAX_RATE impediu
+        self.wins = {PRIMARY: 0, HEDGE: 0}
+        self.failed = 0
+
+    def delay(self, kind: str, provider: str) -> float:
+        key = (provider, kind)
+        if self.latencies.count(key) < self.min_samples:
+            return self.initial_delay
+        return min(max(self.latencies.percentile(key, self.percentile), self.min_delay), self.max_delay)
+
+    def _within_budget(self) -> bool:
+        return sum(self._recent) < self.max_rate * max(len(self._recent), 1)
+
+    async def _attempt(self, role: str, kind: str, client: LLMClient, prompt: str, parse):
+        start = time.monotonic()
+        text = await client.complete(prompt)
+        self.latencies.record((client.name, kind), time.monotonic() - start)
+        return role, parse(text)
+
+    async def run(self, kind: str, primary: LLMClient, prompt: str, parse):
+        """
+        parse recebe o texto e devolve o resultado, ou levanta exceção se for
+        inválido (a outra requisição ainda pode valer)
+        """
+        self.requests += 1
+        secondary = get_llm_client(self.secondary) if self.secondary else None
+        if secondary is primary:
+            secondary = None
+        if secondary is None:
+            self._recent.append(False)
+            return (await self._attempt(PRIMARY, kind, primary, prompt, parse))[1]
+
+        delay = self.delay(kind, primary.name)
+        start = time.monotonic()
+        primary_task = asyncio.create_task(self._attempt(PRIMARY, kind, primary, prompt, parse))
+        tasks = {primary_task}
+        hedged = False
+        waiting_delay = True
+        errors = []
+        try:
+            while tasks:
+                timeout = max(delay - (time.monotonic() - start), 0) if waiting_delay else None
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        role, result = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    self._finish(kind, hedged, role, delay, start)
+                    return result
+
+                if hedged:
+                    continue
+                if errors:
+                    # Principal falhou ou respondeu algo inválido: o secundário é a alternativa
+                    reason = "principal falhou"
+                elif not done:
+                    waiting_delay = False
+                    if not self._within_budget():
+                        self.skipped += 1
+                        continue
+                    reason = "principal lenta"
+                else:
+                    continue
+                hedged = True
+                self.hedged += 1
+                logger.info(
+                    "Hedging %s: %s -> %s após %.1fs (atraso %.1fs, %s)",
+                    kind, primary.name, self.secondary, time.monotonic() - start, delay, reason
+                )
+                tasks.add(asyncio.create_task(self._attempt(HEDGE, kind, secondary, prompt, parse)))
+        finally:
+            if primary_task in tasks:
+                # A principal perdeu: a latência dela foi pelo menos o tempo decorrido
+                self.latencies.record((primary.name, kind), time.monotonic() - start)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._recent.append(hedged)
+        self.failed += 1
+        raise errors[0]
+
+    def _finish(self, kind: str, hedged: bool, role: str, delay: float, start: float):
+        self._recent.append(hedged)
+        self.wins[role] += 1
+        if hedged:
+            logger.info(
+                "Hedging %s: venceu %s em %.1fs (atraso %.1fs)",
+                kind, role, time.monotonic() - start, delay
+            )
+
+    def stats(self) -> dict:
+        return {
+            "secondary": self.secondary or None,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "skipped_by_rate": self.skipped,
+            "primary_won": self.wins[PRIMARY],
+            "hedge_won": self.wins[HEDGE],
+            "failed": self.failed,
+            "latency": self.latencies.stats(),
+        }
+
+
+# Instância global do hedging de chamadas à IA
+hedger = Hedger(
+    secondary=LLM_HEDGE_PROVIDER,
+    percentile=LLM_HEDGE_PERCENTILE,
+    min_delay=LLM_HEDGE_MIN_DELAY,
+    max_delay=LLM_HEDGE_MAX_DELAY,
+    initial_delay=LLM_HEDGE_INITIAL_DELAY,
+    min_samples=LLM_HEDGE_MIN_SAMPLES,
+    window=LLM_HEDGE_WINDOW,
+    max_rate=LLM_HEDGE_MAX_RATE,
+)
@@ -0,0 +1,714 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import update, delete, select, func, text, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from . import schemas, models, generation, credits, payloads, translation
+from .database import AsyncSessionLocal
+from .llm import LLMUnavailableError, get_llm_client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "true").lower() == "true"
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))  # Gerações simultâneas por processo
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", 15))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", 90))  # Sem heartbeat por esse tempo = worker morreu
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_LEASE_RETRY_DELAY = float(os.getenv("JOB_LEASE_RETRY_DELAY", 5))  # Job duplicado volta à fila por esse tempo
+
+# Escalonador global (todos os processos, via tabela de jobs)
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", 32))  # Gerações simultâneas somando todos os workers
+JOB_QUEUE_MAX_WAIT = float(os.getenv("JOB_QUEUE_MAX_WAIT", 120))  # Espera estimada acima disso: 503
+JOB_ESTIMATED_SECONDS = float(os.getenv("JOB_ESTIMATED_SECONDS", 60))  # Duração média até haver medições
+JOB_QUEUE_SNAPSHOT_TTL = float(os.getenv("JOB_QUEUE_SNAPSHOT_TTL", 1))  # Contagens da fila reaproveitadas por esse tempo
+JOB_INLINE_POLL_INTERVAL = float(os.getenv("JOB_INLINE_POLL_INTERVAL", 0.2))  # Espera de uma vaga para geração na requisição
+# Peso de cada plano na fila justa: "free:1,pro:4"
+PLAN_WEIGHTS = {
+    plan.strip(): float(weight)
+    for plan, _, weight in (item.partition(":") for item in os.getenv("PLAN_WEIGHTS", "free:1,pro:4").split(","))
+    if plan.strip()
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Tipos de job
+COURSE = "course"  # Gerar um curso a partir de um CourseRequest
+TRANSLATE = "translate"  # Traduzir um curso existente para um novo curso
+INLINE = "inline"  # Geração feita na própria requisição (stream, regerar); a linha só ocupa a vaga
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+# Operações de banco. Cada uma abre e fecha a própria sessão, então nenhuma
+# conexão fica presa enquanto a IA está gerando o curso.
+
+def plan_weight(plan) -> float:
+    return PLAN_WEIGHTS.get(plan or "free", 1.0)
+
+
+def pick_fair(queued_by_user: dict, running_by_user: dict, weights: dict, slots: int) -> list:
+    """
+    Fila justa ponderada: cada vaga vai para o usuário com menos jobs rodando
+    em proporção ao peso do plano (empate: o job mais antigo). queued_by_user
+    tem, por usuário, a lista de (job_id, created_at) em ordem de chegada
+    """
+    running = dict(running_by_user)
+    queues = {user_id: deque(jobs) for user_id, jobs in queued_by_user.items() if jobs}
+    picked = []
+    while queues and len(picked) < slots:
+        user_id = min(
+            queues,
+            key=lambda user: ((running.get(user, 0) + 1) / weights.get(user, 1.0), queues[user][0][1])
+        )
+        job_id, _ = queues[user_id].popleft()
+        picked.append(job_id)
+        running[user_id] = running.get(user_id, 0) + 1
+        if not queues[user_id]:
+            del queues[user_id]
+    return picked
+
+
+async def _claim_jobs(limit: int, inline_ids: list = None) -> list:
+    """
+    Reivindica até `limit` jobs de curso e tradução para este pool, na ordem
+    da fila justa e dentro de JOB_MAX_RUNNING. Com inline_ids, disputa só as
+    vagas desses jobs INLINE (as requisições que esperam por eles seguem)
+    """
+    async with AsyncSessionLocal() as db:
+        if db.bind.dialect.name == "postgresql":
+            # Serializa as reivindicações entre processos para o limite global ser exato
+            await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('lessonhub.generation_jobs.claim'))"))
+
+        result = await db.execute(
+            select(models.GenerationJob.user_id, func.count())
+            .where(models.GenerationJob.status == RUNNING)
+            .group_by(models.GenerationJob.user_id)
+        )
+        running_by_user = dict(result.all())
+        slots = min(limit, JOB_MAX_RUNNING - sum(running_by_user.values()))
+        if slots <= 0:
+            return []
+
+        # Os `slots` jobs mais antigos de cada usuário: um usuário com muitos
+        # jobs na fila não esconde os outros
+        ranked = (
+            select(
+                models.GenerationJob.id,
+                models.GenerationJob.user_id,
+                models.GenerationJob.created_at,
+                func.row_number().over(
+                    partition_by=models.GenerationJob.user_id,
+                    order_by=models.GenerationJob.created_at
+                ).label("position")
+            )
+            .where(
+                models.GenerationJob.status == QUEUED,
+                models.GenerationJob.id.in_(inline_ids) if inline_ids is not None else models.GenerationJob.kind != INLINE,
+                or_(models.GenerationJob.run_after.is_(None), models.GenerationJob.run_after <= _utcnow())
+            )
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked.c.id, ranked.c.user_id, ranked.c.created_at, models.User.plan)
+            .join(models.User, models.User.id == ranked.c.user_id)
+            .where(ranked.c.position <= slots)
+            .order_by(ranked.c.created_at)
+        )
+        queued_by_user = {}
+        weights = {}
+        created = {}
+        for job_id, user_id, created_at, plan in result.all():
+            queued_by_user.setdefault(user_id, []).append((job_id, created_at))
+            weights[user_id] = plan_weight(plan)
+            created[job_id] = created_at
+
+        claimed = []
+        for job_id in pick_fair(queued_by_user, running_by_user, weights, slots):
+            # UPDATE condicional: só um worker consegue mudar queued -> running
+            result = await db.execute(
+                update(models.GenerationJob)
+                .where(models.GenerationJob.id == job_id, models.GenerationJob.status == QUEUED)
+                .values(
+                    status=RUNNING,
+                    attempts=models.GenerationJob.attempts + 1,
+                    heartbeat_at=_utcnow(),
+                    updated_at=_utcnow()
+                )
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+                job_scheduler.record_wait(created[job_id])
+        await db.commit()
+    return claimed
+
+
+async def _enqueue_inline(user_id: int) -> str:
+    async with AsyncSessionLocal() as db:
+        job = models.GenerationJob(user_id=user_id, kind=INLINE, request={})
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+async def _delete_job(job_id: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.GenerationJob).where(models.GenerationJob.id == job_id))
+        await db.commit()
+
+
+async def _load_job(job_id: str):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(models.GenerationJob, job_id)
+        return job.user_id, job.kind, job.request, job.request_hash
+
+
+async def _load_translation_source(course_id: int, user_id: int):
+    """
+    (conteúdo, pedido) do curso a traduzir; o pedido do novo curso mantém nível e tom
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.Course).where(
+            models.Course.id == course_id,
+            models.Course.user_id == user_id
+        ))
+        course = result.scalars().first()
+        if course is None:
+            raise ValueError("curso de origem não encontrado")
+        course_data = {
+            "title": course.title,
+            "subtitle": course.subtitle,
+            "wallpaper": course.wallpaper,
+            "modules": course.modules,
+            "final_summary": course.final_summary,
+            "assessment_quiz": course.assessment_quiz,
+        }
+        return course_data, course.depth_level, course.voice_tone
+
+
+async def _heartbeat(job_id: str):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(models.GenerationJob, job_id)
+        await db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job_id, models.GenerationJob.status == RUNNING)
+            .values(heartbeat_at=_utcnow())
+        )
+        if job.reservation_id:
+            await credits.extend_reservation(db, job.reservation_id)
+        await db.execute(
+            update(models.GenerationLease)
+            .where(models.GenerationLease.job_id == job_id)
+            .values(expires_at=_utcnow() + timedelta(seconds=JOB_STALE_AFTER))
+        )
+        await db.commit()
+
+
+async def _acquire_lease(request_hash: str, job_id: str) -> bool:
+    async with AsyncSessionLocal() as db:
+        # Lease de um worker que morreu pode ser assumida
+        await db.execute(
+            delete(models.GenerationLease)
+            .where(models.GenerationLease.request_hash == request_hash, models.GenerationLease.expires_at < _utcnow())
+        )
+        db.add(models.GenerationLease(
+            request_hash=request_hash,
+            job_id=job_id,
+            expires_at=_utcnow() + timedelta(seconds=JOB_STALE_AFTER)
+        ))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+
+async def _release_lease(job_id: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.GenerationLease).where(models.GenerationLease.job_id == job_id))
+        await db.commit()
+
+
+async def _find_shared_result(request_hash: str):
+    """
+    Conteúdo de um job já concluído com o mesmo pedido (gerado em qualquer processo)
+    """
+    cutoff = _utcnow() - timedelta(seconds=generation.GENERATION_CACHE_TTL)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Course)
+            .join(models.GenerationJob, models.GenerationJob.course_id == models.Course.id)
+            .where(
+                models.GenerationJob.request_hash == request_hash,
+                models.GenerationJob.status == DONE,
+                models.GenerationJob.updated_at >= cutoff
+            )
+            .order_by(models.GenerationJob.updated_at.desc())
+            .limit(1)
+        )
+        course = result.scalars().first()
+
+        if course is None:
+            return None
+        return {
+            "title": course.title,
+            "subtitle": course.subtitle,
+            "wallpaper": course.wallpaper,
+            "modules": course.modules,
+            "final_summary": course.final_summary,
+            "assessment_quiz": course.assessment_quiz,
+        }
+
+
+async def _complete_job(job_id: str, user_id: int, course_request: schemas.CourseRequest, course_data: dict):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(models.GenerationJob, job_id)
+        new_course = generation.build_course(course_data, course_request, user_id)
+        db.add(new_course)
+        await db.flush()
+        await payloads.store_course_payloads(db, new_course)
+
+        result = await db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job_id, models.GenerationJob.status == RUNNING)
+            .values(status=DONE, course_id=new_course.id, error=None, updated_at=_utcnow())
+        )
+        if result.rowcount != 1:
+            # Outro worker assumiu o job (heartbeat perdido); descarta este resultado
+            await db.rollback()
+            return
+        if job.reservation_id:
+            await credits.commit_reservation(db, job.reservation_id)
+        await db.commit()
+
+
+async def _fail_job(job_id: str, error: str):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(models.GenerationJob, job_id)
+        result = await db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job_id, models.GenerationJob.status.in_([QUEUED, RUNNING]))
+            .values(status=FAILED, error=error, updated_at=_utcnow())
+        )
+        if result.rowcount == 1:
+            # Devolver o crédito reservado na submissão
+            if job.reservation_id:
+                await credits.release_reservation(db, job.reservation_id)
+            else:
+                # Jobs criados antes do ledger de créditos
+                await db.execute(
+                    update(models.User)
+                    .where(models.User.id == job.user_id)
+                    .values(credits=models.User.credits + 1)
+                )
+        await db.commit()
+
+
+async def _requeue_job(job_id: str, delay: float = 0):
+    async with AsyncSessionLocal() as db:
+        # Desligamento gracioso (ou lease ocupada) não conta como tentativa
+        await db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job_id, models.GenerationJob.status == RUNNING)
+            .values(
+                status=QUEUED,
+                attempts=models.GenerationJob.attempts - 1,
+                run_after=_utcnow() + timedelta(seconds=delay) if delay else None,
+                updated_at=_utcnow()
+            )
+        )
+        await db.commit()
+
+
+async def _recover_stale_jobs():
+    cutoff = _utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    async with AsyncSessionLocal() as db:
+        # Vaga INLINE que nunca saiu: a requisição que esperava morreu com o processo
+        await db.execute(delete(models.GenerationJob).where(
+            models.GenerationJob.kind == INLINE,
+            models.GenerationJob.status == QUEUED,
+            models.GenerationJob.created_at < cutoff - timedelta(seconds=JOB_QUEUE_MAX_WAIT)
+        ))
+        await db.commit()
+        result = await db.execute(
+            select(models.GenerationJob.id, models.GenerationJob.kind, models.GenerationJob.attempts).where(
+                models.GenerationJob.status == RUNNING,
+                models.GenerationJob.heartbeat_at < cutoff
+            )
+        )
+        stale = result.all()
+
+    for job_id, kind, attempts in stale:
+        if kind == INLINE:
+            # A requisição que ocupava a vaga morreu com o processo
+            await _delete_job(job_id)
+            continue
+        if attempts >= JOB_MAX_ATTEMPTS:
+            await _fail_job(job_id, "Falha na geração do curso após várias tentativas. Tente novamente.")
+            continue
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.GenerationJob)
+                .where(
+                    models.GenerationJob.id == job_id,
+                    models.GenerationJob.status == RUNNING,
+                    models.GenerationJob.heartbeat_at < cutoff
+                )
+                .values(status=QUEUED, updated_at=_utcnow())
+            )
+            await db.commit()
+        logger.warning("Job %s sem heartbeat, devolvido para a fila", job_id)
+
+
+class _LeaseBusy(Exception):
+    """Outro job está gerando o mesmo pedido"""
+
+
+class JobScheduler:
+    """
+    Controle de admissão da fila de geração: estima a espera de um job novo
+    (jobs à frente / vagas globais x duração média) e recusa com 503 +
+    Retry-After quando passa de max_wait, em vez de deixar a fila crescer
+    até os jobs estourarem o timeout
+    """
+
+    def __init__(self, max_running: int = 32, max_wait: float = 120, estimated_seconds: float = 60,
+                 snapshot_ttl: float = 1):
+        self.max_running = max_running
+        self.max_wait = max_wait
+        self.snapshot_ttl = snapshot_ttl
+        self.average_duration = estimated_seconds  # Média móvel exponencial das gerações deste processo
+        self.rejected = 0
+        self._waits = deque(maxlen=200)
+        self._snapshot = None
+        self._snapshot_at = 0.0
+
+    def record_wait(self, created_at: datetime):
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)  # SQLite não guarda o fuso
+        self._waits.append(max((_utcnow() - created_at).total_seconds(), 0.0))
+
+    def record_duration(self, seconds: float):
+        self.average_duration += 0.1 * (seconds - self.average_duration)
+
+    async def snapshot(self, db: AsyncSession) -> dict:
+        if self._snapshot is None or time.monotonic() - self._snapshot_at > self.snapshot_ttl:
+            result = await db.execute(
+                select(models.GenerationJob.status, func.count())
+                .where(models.GenerationJob.status.in_([QUEUED, RUNNING]))
+                .group_by(models.GenerationJob.status)
+            )
+            counts = dict(result.all())
+            self._snapshot = {"queued": counts.get(QUEUED, 0), "running": counts.get(RUNNING, 0)}
+            self._snapshot_at = time.monotonic()
+        return self._snapshot
+
+    def estimated_wait(self, snapshot: dict) -> float:
+        ahead = snapshot["queued"] + snapshot["running"] - self.max_running + 1
+        if ahead <= 0:
+            return 0.0
+        return math.ceil(ahead / self.max_running) * self.average_duration
+
+    async def admit(self, db: AsyncSession):
+        """
+        Para as rotas de geração: 503 + Retry-After se a fila está longa demais
+        """
+        wait = self.estimated_wait(await self.snapshot(db))
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Muitas gerações na fila. Tente novamente em instantes.",
+                headers={"Retry-After": str(max(math.ceil(wait - self.max_wait), 1))}
+            )
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "max_running": self.max_running,
+            "queued": self._snapshot["queued"] if self._snapshot else None,
+            "running": self._snapshot["running"] if self._snapshot else None,
+            "estimated_wait": round(self.estimated_wait(self._snapshot), 1) if self._snapshot else None,
+            "average_duration": round(self.average_duration, 1),
+            "queue_wait_p50": round(waits[len(waits) // 2], 2) if waits else None,
+            "queue_wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+            "rejected": self.rejected,
+        }
+
+
+class InlinePromoter:
+    """
+    Reivindica as vagas dos jobs INLINE que esperam neste processo: uma
+    reivindicação por intervalo para todos eles, em vez de uma por requisição.
+    Só roda enquanto há alguém esperando
+    """
+
+    def __init__(self, poll_interval: float = 0.2):
+        self.poll_interval = poll_interval
+        self._waiting = {}  # job_id -> Event de quando a vaga sai
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def wait(self, job_id: str, timeout: float) -> bool:
+        """
+        True quando o job passa a running; False se não sair em `timeout`
+        """
+        event = asyncio.Event()
+        self._waiting[job_id] = event
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        else:
+            self.notify()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting.pop(job_id, None)
+
+    async def _run(self):
+        while self._waiting:
+            self._wakeup.clear()
+            try:
+                waiting = list(self._waiting)
+                for job_id in await _claim_jobs(len(waiting), inline_ids=waiting):
+                    event = self._waiting.get(job_id)
+                    if event is not None:
+                        event.set()
+            except Exception:
+                logger.exception("Erro ao reivindicar vagas de jobs inline")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+class InlineSlot:
+    """
+    Vaga no limite global para uma geração feita na própria requisição
+    (stream, regerar módulo ou aula): entra na fila justa como um job INLINE
+    e espera ser reivindicada, então conta em JOB_MAX_RUNNING enquanto roda.
+    acquire() pode ser chamado antes (ex.: para responder 503 antes do
+    stream começar); `async with` mantém o heartbeat e libera a vaga no fim
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.job_id = None
+        self._heartbeat = None
+
+    async def acquire(self):
+        """
+        Espera a vaga; 503 + Retry-After se não sair em JOB_QUEUE_MAX_WAIT
+        """
+        if self.job_id is not None:
+            return
+        job_id = await _enqueue_inline(self.user_id)
+        try:
+            if not await inline_promoter.wait(job_id, JOB_QUEUE_MAX_WAIT):
+                job_scheduler.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Muitas gerações na fila. Tente novamente em instantes.",
+                    headers={"Retry-After": str(max(math.ceil(job_scheduler.average_duration), 1))}
+                )
+        except BaseException:
+            await _delete_job(job_id)
+            raise
+        self.job_id = job_id
+
+    async def release(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self.job_id is not None:
+            await _delete_job(self.job_id)
+            self.job_id = None
+            # Vaga liberada: quem espera neste processo busca o próximo da fila
+            job_pool.notify()
+            inline_promoter.notify()
+
+    async def __aenter__(self):
+        await self.acquire()
+        self._heartbeat = asyncio.create_task(job_pool._heartbeat_loop(self.job_id))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.release()
+
+
+# Vagas das gerações na própria requisição deste processo
+inline_promoter = InlinePromoter(poll_interval=JOB_INLINE_POLL_INTERVAL)
+
+# Instância global do escalonador
+job_scheduler = JobScheduler(
+    max_running=JOB_MAX_RUNNING,
+    max_wait=JOB_QUEUE_MAX_WAIT,
+    estimated_seconds=JOB_ESTIMATED_SECONDS,
+    snapshot_ttl=JOB_QUEUE_SNAPSHOT_TTL
+)
+
+
+class JobWorkerPool:
+    """
+    Pool de workers que consome a tabela generation_jobs.
+
+    Cada processo do uvicorn roda um pool; os jobs são reivindicados com UPDATE
+    condicional, então vários processos podem consumir a mesma fila.
+    """
+
+    def __init__(self, concurrency: int = 4, poll_interval: float = 1.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks = set()
+        self._runner = None
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Acorda o pool para buscar jobs imediatamente"""
+        self._wakeup.set()
+
+    async def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._runner, *self._tasks, return_exceptions=True)
+        self._runner = None
+
+    async def _run(self):
+        last_recovery = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_recovery > JOB_HEARTBEAT_INTERVAL:
+                    await _recover_stale_jobs()
+                    await credits.sweep_expired_reservations()
+                    last_recovery = time.monotonic()
+
+                free_slots = self.concurrency - len(self._tasks)
+                if free_slots > 0:
+                    for job_id in await _claim_jobs(free_slots):
+                        task = asyncio.create_task(self._run_job(job_id))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                        # Vaga liberada: busca o próximo da fila sem esperar o poll
+                        task.add_done_callback(lambda _: self.notify())
+            except Exception:
+                logger.exception("Erro no loop do pool de jobs")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _heartbeat_loop(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                await _heartbeat(job_id)
+            except Exception:
+                logger.exception("Erro ao registrar heartbeat do job %s", job_id)
+
+    async def _resolve_content(self, job_id: str, course_request: schemas.CourseRequest, request_hash: str) -> dict:
+        """
+        Single-flight entre processos: só o job que obtém a lease do request_hash
+        chama a IA; os demais voltam para a fila (_LeaseBusy) e, na próxima
+        vez, copiam o resultado salvo
+        """
+        course_data = generation.get_cached_content(course_request)
+        if course_data is not None:
+            return course_data
+        if request_hash is None or generation.GENERATION_CACHE_SIZE <= 0:
+            # fresh ou cache desligado: não reaproveita o curso de outro job
+            return await generation.generate_course_content(course_request)
+
+        course_data = await _find_shared_result(request_hash)
+        if course_data is not None:
+            return course_data
+        if await _acquire_lease(request_hash, job_id):
+            # A lease só é liberada depois que o curso é salvo (em _run_job)
+            return await generation.generate_course_content(course_request)
+        # Não segura a vaga do pool esperando o outro job terminar
+        raise _LeaseBusy()
+
+    async def _translate(self, user_id: int, request_data: dict) -> tuple:
+        source, depth_level, voice_tone = await _load_translation_source(request_data["course_id"], user_id)
+        course_request = schemas.CourseRequest(
+            topic=source["title"],
+            language=request_data["language"],
+            depth_level=depth_level,
+            voice_tone=voice_tone,
+            provider=request_data.get("provider")
+        )
+        client = get_llm_client(course_request.provider)
+        course_data = await asyncio.wait_for(
+            translation.translate_course(client, source, course_request.language),
+            timeout=generation.GENERATION_TIMEOUT
+        )
+        return course_request, course_data
+
+    async def _run_job(self, job_id: str):
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job_id))
+        try:
+            user_id, kind, request_data, request_hash = await _load_job(job_id)
+            started = time.monotonic()
+            if kind == TRANSLATE:
+                course_request, course_data = await self._translate(user_id, request_data)
+            else:
+                course_request = schemas.CourseRequest(**request_data)
+                course_data = await self._resolve_content(job_id, course_request, request_hash)
+            job_scheduler.record_duration(time.monotonic() - started)
+            await _complete_job(job_id, user_id, course_request, course_data)
+            if kind != TRANSLATE:
+                generation.cache_content(course_request, course_data)
+        except asyncio.CancelledError:
+            # Worker desligando (ex.: limit_max_requests); o job volta para a fila
+            await _requeue_job(job_id)
+            raise
+        except _LeaseBusy:
+            await _requeue_job(job_id, delay=JOB_LEASE_RETRY_DELAY)
+        except asyncio.TimeoutError:
+            await _fail_job(job_id, "Timeout na geração do curso. Tente novamente.")
+        except LLMUnavailableError as e:
+            await _fail_job(job_id, str(e))
+        except (json.JSONDecodeError, ValueError) as e:
+            # Resposta inválida mesmo depois de refazer as seções
+            await _fail_job(job_id, f"Erro ao processar resposta da IA: {str(e)}")
+        except Exception as e:
+            logger.exception("Erro ao gerar curso do job %s", job_id)
+            await _fail_job(job_id, f"Erro ao gerar curso: {str(e)}")
+        finally:
+            heartbeat.cancel()
+            await _release_lease(job_id)
+            self.notify()
+            inline_promoter.notify()
+
+
+# Instância global do pool de jobs
+job_pool = JobWorkerPool(concurrency=JOB_WORKER_CONCURRENCY, poll_interval=JOB_POLL_INTERVAL)
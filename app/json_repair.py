@@ -0,0 +1,77 @@
+import json
+
+CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str) -> tuple:
+    """
+    Parse tolerante da resposta da IA. Ignora cercas de markdown e texto em
+    volta do JSON, remove vírgulas sobrando antes de } e ] e fecha objetos e
+    listas de uma resposta cortada (descartando o último elemento incompleto).
+
+    Retorna (valor, truncated); truncated indica que a resposta terminou antes
+    de fechar o JSON. Levanta json.JSONDecodeError se não houver o que salvar
+    """
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        raise json.JSONDecodeError("Nenhum JSON na resposta", text, 0)
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    pending_comma = False
+    # (tamanho de out, pilha) do último ponto em que o JSON pode ser fechado:
+    # só depois de um valor completo, nunca logo após abrir { ou [
+    safe = None
+
+    for char in text[min(starts):]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char.isspace():
+            continue
+        if char == ",":
+            safe = (len(out), tuple(stack))
+            pending_comma = True
+            continue
+        if char in "}]":
+            if not stack:
+                continue
+            # Vírgula antes do fechamento é descartada; fechamento trocado vira o esperado
+            pending_comma = False
+            out.append(stack.pop())
+            if not stack:
+                break
+            safe = (len(out), tuple(stack))
+            continue
+
+        if pending_comma:
+            out.append(",")
+            pending_comma = False
+        out.append(char)
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+
+    if not stack:
+        return json.loads("".join(out), strict=False), False
+
+    # Resposta cortada: tenta fechar como está, senão volta ao último elemento completo
+    if not in_string:
+        try:
+            return json.loads("".join(out) + "".join(reversed(stack)), strict=False), True
+        except json.JSONDecodeError:
+            pass
+    if safe is None:
+        raise json.JSONDecodeError("Resposta da IA incompleta", text, len(text))
+    length, safe_stack = safe
+    return json.loads("".join(out[:length]) + "".join(reversed(safe_stack)), strict=False), True
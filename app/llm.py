@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from typing import Optional
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from .providers import LLMProvider, OPENAI, PROVIDERS, create_provider
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Provedor padrão da implantação e os que podem ser escolhidos por pedido
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", OPENAI)
+LLM_ALLOWED_PROVIDERS = {
+    name.strip() for name in os.getenv("LLM_ALLOWED_PROVIDERS", LLM_PROVIDER).split(",") if name.strip()
+} | {LLM_PROVIDER}
+
+# Novas tentativas em erros transitórios (conexão, timeout, 408/409/429/5xx)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 20))
+
+# Circuit breaker: após N falhas transitórias seguidas, recusa chamadas por um tempo
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailableError(Exception):
+    """
+    O circuit breaker está aberto: o provedor de IA está falhando
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__("Serviço de IA indisponível no momento. Tente novamente em instantes.")
+        self.retry_after = retry_after
+
+
+def retry_delay(attempt: int, error: Exception = None) -> float:
+    """
+    Backoff exponencial com jitter completo; respeita o Retry-After do provedor
+    """
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            retry_after = None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, LLM_RETRY_MAX_DELAY))
+    return delay
+
+
+class CircuitBreaker:
+    """
+    closed: chamadas passam. open: recusadas até reset_seconds depois da
+    última falha. half_open: uma chamada de teste decide se fecha ou reabre
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.reset_seconds - time.monotonic(), 0.0)
+
+    def available(self) -> bool:
+        if self.state == OPEN and self.retry_after() == 0:
+            return True
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self._probing)
+
+    def before_call(self):
+        if self.state == OPEN and self.retry_after() == 0:
+            self.state = HALF_OPEN
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+            self.rejected += 1
+            raise LLMUnavailableError(self.retry_after() or self.reset_seconds)
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+                logger.warning("Circuit breaker da IA aberto após %d falhas", self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # Chamada de teste sem resultado (ex.: cancelada): libera para outra tentar
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0,
+        }
+
+
+class LLMClient:
+    """
+    Chamadas a um provedor com novas tentativas e circuit breaker próprios.
+    Um por provedor em cada processo (o provedor mantém o pool de conexões)
+    """
+
+    def __init__(self, provider: LLMProvider, max_retries: int = 3, breaker: CircuitBreaker = None, name: str = None):
+        self.provider = provider
+        self.name = name or provider.name  # "provedor" ou "provedor:modelo"
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def ensure_available(self):
+        """
+        Para as rotas: 503 + Retry-After antes de reservar créditos ou enfileirar
+        """
+        if not self.breaker.available():
+            raise HTTPException(
+                status_code=503,
+                detail="Serviço de IA indisponível no momento. Tente novamente em instantes.",
+                headers={"Retry-After": str(max(math.ceil(self.breaker.retry_after()), 1))}
+            )
+
+    async def _call(self, call):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.calls += 1
+            try:
+                result = await call()
+            except BaseException as e:
+                if not isinstance(e, Exception) or not self.provider.is_transient(e):
+                    # Erro do pedido (4xx) ou cancelamento: não diz nada sobre a saúde do provedor
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or self.breaker.state == OPEN:
+                    self.failures += 1
+                    raise
+                delay = retry_delay(attempt, e)
+                logger.warning(
+                    "Erro transitório da IA (%s, tentativa %d), nova tentativa em %.1fs: %s",
+                    self.name, attempt + 1, delay, e
+                )
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def complete(self, prompt: str) -> str:
+        return await self._call(lambda: self.provider.complete(prompt))
+
+    async def stream(self, prompt: str):
+        """
+        Pedaços de texto conforme chegam. As novas tentativas valem só até o
+        primeiro pedaço; depois disso um erro interrompe a geração
+        """
+        async def start():
+            stream = self.provider.stream(prompt)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        stream, first = await self._call(start)
+        try:
+            if first is None:
+                return
+            yield first
+            async for text in stream:
+                yield text
+        finally:
+            await stream.aclose()
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "breaker": self.breaker.stats(),
+        }
+
+
+# Clientes por provedor, criados no primeiro uso
+llm_clients = {}
+
+
+def get_llm_client(provider: Optional[str] = None) -> LLMClient:
+    name = provider or LLM_PROVIDER
+    client = llm_clients.get(name)
+    if client is None:
+        client = LLMClient(
+            create_provider(name),
+            max_retries=LLM_MAX_RETRIES,
+            breaker=CircuitBreaker(failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD, reset_seconds=LLM_BREAKER_RESET_SECONDS),
+            name=name
+        )
+        llm_clients[name] = client
+    return client
+
+
+def llm_client_for(provider: Optional[str]) -> LLMClient:
+    """
+    Cliente do provedor pedido na requisição (ou o padrão); 422 se a
+    implantação não permite escolhê-lo
+    """
+    if provider is not None and (provider not in PROVIDERS or provider not in LLM_ALLOWED_PROVIDERS):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Provedor de IA não disponível: {provider}"
+        )
+    return get_llm_client(provider)
+
+
+async def close_llm_clients():
+    for client in llm_clients.values():
+        await client.aclose()
+    llm_clients.clear()
+
+
+def llm_stats() -> dict:
+    return {name: client.stats() for name, client in llm_clients.items()}
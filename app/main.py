@@ -1,9 +1,17 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from .routes import auth, users, courses
-from .database import engine, Base
-from .middleware import rate_limit_middleware
+from .routes import auth, users, courses, jobs
+from .database import engine, async_engine, Base
+from .middleware import RateLimitMiddleware, ProcessTimeMiddleware, rate_limiter, concurrency_limiter, RATE_LIMIT_EVICT_INTERVAL
+from .jobs import job_pool, job_scheduler, JOB_WORKER_ENABLED
+from .generation import generation_cache
+from .utils import token_cache, user_cache
+from .hashing import password_hasher
+from .llm import close_llm_clients, llm_stats
+from .hedging import hedger
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 import time
@@ -12,14 +20,29 @@ load_dotenv()
 
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de workers da fila de geração (pode ser desligado em processos só de API)
+    if JOB_WORKER_ENABLED:
+        await job_pool.start()
+    # Remove periodicamente clientes ociosos do rate limiter
+    eviction_task = asyncio.create_task(rate_limiter.run_eviction(RATE_LIMIT_EVICT_INTERVAL))
+    yield
+    eviction_task.cancel()
+    await job_pool.stop()
+    password_hasher.shutdown()
+    await close_llm_clients()
+    await async_engine.dispose()
+
 app = FastAPI(
     title="LessonHub API",
     description="API para geração de cursos online",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Middleware de rate limiting
-app.middleware("http")(rate_limit_middleware)
+app.add_middleware(RateLimitMiddleware)
 
 # Configuração do CORS para aceitar tudo
 app.add_middleware(
@@ -28,6 +51,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Id"],  # Cursor de GET /my-courses
 )
 
 # Middleware para hosts confiáveis (opcional, para produção)
@@ -37,17 +61,12 @@ app.add_middleware(
 # )
 
 # Middleware para logging de performance
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+app.add_middleware(ProcessTimeMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(courses.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 def root():
@@ -55,4 +74,20 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "timestamp": time.time()}
\ No newline at end of file
+    return {"status": "healthy", "timestamp": time.time()}
+
+@app.get("/metrics")
+def metrics():
+    # Contadores deste processo
+    return {
+        "generation_cache": generation_cache.stats(),
+        "auth_token_cache": token_cache.stats(),
+        "auth_user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "rate_limit_concurrency": concurrency_limiter.stats(),
+        "llm": llm_stats(),
+        "llm_hedging": hedger.stats(),
+        "job_queue": job_scheduler.stats(),
+    }
+
@@ -1,62 +1,304 @@
-from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-import time
+from starlette.datastructures import Headers
+from typing import NamedTuple, Optional
 import asyncio
-from collections import defaultdict
-import threading
+import logging
+import math
+import os
+import re
+import time
+from dotenv import load_dotenv
+from .ratelimit import MemoryStore, create_store
+from .utils import token_subject
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", 100))
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", 60))
+# memory: por processo | shm: compartilhado entre os workers do host | sqlite: fallback em arquivo
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "shm")
+RATE_LIMIT_STORE_PATH = os.getenv("RATE_LIMIT_STORE_PATH") or None
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", 64))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 200000))  # Limite de memória do limiter
+RATE_LIMIT_EVICT_INTERVAL = float(os.getenv("RATE_LIMIT_EVICT_INTERVAL", 30))
+
+# Orçamentos por rota (ver ROUTE_POLICIES)
+RATE_LIMIT_AUTH_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_AUTH_MAX_REQUESTS", 20))
+RATE_LIMIT_LLM_BUDGET = int(os.getenv("RATE_LIMIT_LLM_BUDGET", 60))  # Unidades por janela
+RATE_LIMIT_LLM_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_LLM_WINDOW_SECONDS", 3600))
+RATE_LIMIT_LLM_CONCURRENCY = int(os.getenv("RATE_LIMIT_LLM_CONCURRENCY", 2))
+RATE_LIMIT_COURSE_COST = int(os.getenv("RATE_LIMIT_COURSE_COST", 10))
+RATE_LIMIT_REGENERATE_COST = int(os.getenv("RATE_LIMIT_REGENERATE_COST", 2))  # Regerar um módulo ou uma aula
+RATE_LIMIT_TRANSLATE_COST = int(os.getenv("RATE_LIMIT_TRANSLATE_COST", 3))
+RATE_LIMIT_CONCURRENCY_RETRY_AFTER = int(os.getenv("RATE_LIMIT_CONCURRENCY_RETRY_AFTER", 10))
+# Duração máxima de uma vaga de concorrência: de um worker que morreu, volta depois disso
+RATE_LIMIT_CONCURRENCY_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_CONCURRENCY_LEASE_SECONDS", 900))
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # Segundos até a próxima requisição ser aceita (0 se aceita)
 
 class RateLimiter:
-    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+    """
+    Rate limiter GCRA (Generic Cell Rate Algorithm): cada cliente guarda só
+    um float, o "theoretical arrival time" (TAT). Cada verificação é O(1),
+    e até `max_requests` requisições podem chegar de uma vez dentro da janela.
+
+    O estado fica num store (ver app/ratelimit.py): em memória, por processo,
+    ou compartilhado entre os workers do host (shm/sqlite), o que faz o limite
+    valer para o cliente independente do worker que atende.
+    """
+
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60, store=None):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests = defaultdict(list)
-        self.lock = threading.Lock()
-    
+        self.emission_interval = window_seconds / max_requests
+        self.store = store or MemoryStore()
+
+    def _gcra(self, cost: int):
+        now = self.store.clock()
+        window = self.window_seconds
+        interval = self.emission_interval
+
+        def gcra(tat):
+            if tat is None or tat < now:
+                tat = now
+            new_tat = tat + interval * cost
+            allow_at = new_tat - window
+            if allow_at > now:
+                remaining = int((window - (tat - now)) / interval)
+                return None, RateLimitResult(False, self.max_requests, max(remaining, 0), allow_at - now)
+            remaining = int((window - (new_tat - now)) / interval)
+            return new_tat, RateLimitResult(True, self.max_requests, remaining, 0.0)
+
+        return gcra
+
+    def check(self, client_id: str, cost: int = 1) -> RateLimitResult:
+        return self.store.update(client_id, self._gcra(cost))
+
+    async def acheck(self, client_id: str, cost: int = 1) -> RateLimitResult:
+        """
+        check para o event loop: espera por locks entre processos (shm
+        disputado, SQLite) acontece numa thread, sem travar o worker
+        """
+        return await self.store.aupdate(client_id, self._gcra(cost))
+
     def is_allowed(self, client_id: str) -> bool:
-        now = time.time()
-        
-        with self.lock:
-            # Limpar requisições antigas
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if now - req_time < self.window_seconds
-            ]
-            
-            # Verificar se ainda há espaço
-            if len(self.requests[client_id]) >= self.max_requests:
-                return False
-            
-            # Adicionar nova requisição
-            self.requests[client_id].append(now)
-            return True
-
-# Instância global do rate limiter
-rate_limiter = RateLimiter(max_requests=100, window_seconds=60)
-
-async def rate_limit_middleware(request: Request, call_next):
-    # Identificar cliente (IP ou user_id se autenticado)
-    client_id = request.client.host
-    
-    # Para endpoints de autenticação, usar IP
-    if request.url.path.startswith("/login") or request.url.path.startswith("/register"):
-        client_id = f"auth_{request.client.host}"
-    
-    # Para endpoints protegidos, usar user_id se disponível
-    if hasattr(request.state, "user"):
-        client_id = f"user_{request.state.user.id}"
-    
-    # Verificar rate limit
-    if not rate_limiter.is_allowed(client_id):
-        return JSONResponse(
-            status_code=429,
-            content={"detail": "Too many requests. Please try again later."}
-        )
-    
-    # Adicionar headers de rate limit
-    response = await call_next(request)
-    response.headers["X-RateLimit-Limit"] = str(rate_limiter.max_requests)
-    response.headers["X-RateLimit-Remaining"] = str(
-        rate_limiter.max_requests - len(rate_limiter.requests[client_id])
+        return self.check(client_id).allowed
+
+    def evict_idle(self) -> int:
+        return self.store.evict_idle()
+
+    async def run_eviction(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Em thread: nos stores compartilhados a varredura faz I/O e pega locks entre processos
+                await asyncio.to_thread(self.evict_idle)
+            except Exception:
+                logger.exception("Falha ao remover clientes ociosos do rate limiter")
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+# Store compartilhado por todos os orçamentos (chaves prefixadas pelo nome do orçamento)
+rate_limit_store = create_store(
+    RATE_LIMIT_BACKEND,
+    max_keys=RATE_LIMIT_MAX_KEYS,
+    shards=RATE_LIMIT_SHARDS,
+    path=RATE_LIMIT_STORE_PATH
+)
+
+class Budget(NamedTuple):
+    limit: int  # Unidades de custo por janela, por identidade
+    window_seconds: int
+    max_concurrent: int = 0  # Requisições simultâneas por identidade, somando os workers (0 = sem limite)
+    by_ip: bool = False  # Ignora o token e limita por IP (login/cadastro)
+
+class RoutePolicy(NamedTuple):
+    methods: tuple  # Vazio = qualquer método
+    pattern: re.Pattern
+    budget: Optional[str]  # None = sem rate limit
+    cost: int
+
+BUDGETS = {
+    "default": Budget(RATE_LIMIT_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS),
+    "auth": Budget(RATE_LIMIT_AUTH_MAX_REQUESTS, RATE_LIMIT_WINDOW_SECONDS, by_ip=True),
+    "llm": Budget(RATE_LIMIT_LLM_BUDGET, RATE_LIMIT_LLM_WINDOW_SECONDS, max_concurrent=RATE_LIMIT_LLM_CONCURRENCY),
+}
+
+# Primeira política que casar com método + caminho vale
+ROUTE_POLICIES = [
+    RoutePolicy(("GET",), re.compile(r"^/(health|metrics)?$"), None, 0),
+    RoutePolicy(("POST",), re.compile(r"^/(login|register)$"), "auth", 1),
+    RoutePolicy(("POST",), re.compile(r"^/generate-course(/stream)?$"), "llm", RATE_LIMIT_COURSE_COST),
+    RoutePolicy(("POST",), re.compile(r"^/courses/\d+/modules/\d+(/lessons/\d+)?/regenerate$"), "llm", RATE_LIMIT_REGENERATE_COST),
+    RoutePolicy(("POST",), re.compile(r"^/courses/\d+/translate$"), "llm", RATE_LIMIT_TRANSLATE_COST),
+    RoutePolicy((), re.compile(r""), "default", 1),
+]
+
+# Um limiter por orçamento, todos no mesmo store
+rate_limiters = {
+    name: RateLimiter(max_requests=budget.limit, window_seconds=budget.window_seconds, store=rate_limit_store)
+    for name, budget in BUDGETS.items()
+}
+rate_limiter = rate_limiters["default"]
+
+class ConcurrencyLimiter:
+    """
+    Requisições em andamento por chave, somando todos os workers: cada uma
+    das `limit` vagas é uma chave do store compartilhado ("<chave>#<n>")
+    cujo valor é o fim da lease. Vaga livre = lease vencida, como um TAT no
+    passado, então a remoção de ociosos do store também vale aqui e a vaga
+    de um worker que morreu volta sozinha depois de lease_seconds
+    """
+
+    def __init__(self, store, lease_seconds: float = 900):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.active = 0  # Vagas seguras por este worker
+        self.rejected = 0
+
+    async def acquire(self, key: str, limit: int) -> Optional[tuple]:
+        """
+        (chave da vaga, fim da lease) para passar a release, ou None se todas estão ocupadas
+        """
+        for slot in range(limit):
+            slot_key = f"{key}#{slot}"
+            expires_at = self.store.clock() + self.lease_seconds
+
+            def take(current):
+                if current is not None and current > self.store.clock():
+                    return None, False
+                return expires_at, True
+
+            if await self.store.aupdate(slot_key, take):
+                self.active += 1
+                return slot_key, expires_at
+        self.rejected += 1
+        return None
+
+    async def release(self, lease: tuple):
+        slot_key, expires_at = lease
+
+        def free(current):
+            # Só a própria lease: se venceu e outro pegou a vaga, não mexe
+            return (0.0, None) if current == expires_at else (None, None)
+
+        self.active -= 1
+        await self.store.aupdate(slot_key, free)
+
+    def stats(self) -> dict:
+        return {"active": self.active, "rejected": self.rejected}
+
+concurrency_limiter = ConcurrencyLimiter(rate_limit_store, lease_seconds=RATE_LIMIT_CONCURRENCY_LEASE_SECONDS)
+
+def match_policy(method: str, path: str) -> RoutePolicy:
+    for policy in ROUTE_POLICIES:
+        if (not policy.methods or method in policy.methods) and policy.pattern.match(path):
+            return policy
+    return ROUTE_POLICIES[-1]
+
+def request_identity(scope, budget: Budget) -> str:
+    """
+    Usuário autenticado (subject do JWT) ou, sem token válido, o IP
+    """
+    if not budget.by_ip:
+        scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            subject = token_subject(token)
+            if subject is not None:
+                return f"user:{subject}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+def _too_many_requests(retry_after: float, limit: int, detail: str = "Too many requests. Please try again later."):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": detail},
+        headers={
+            "Retry-After": str(max(math.ceil(retry_after), 1)),
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": "0",
+        }
     )
-    
-    return response 
\ No newline at end of file
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI de rate limit: os headers entram direto na mensagem
+    http.response.start, sem o pipeline de call_next (que cria uma task e
+    um stream intermediário por requisição)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        policy = match_policy(scope["method"], scope["path"])
+        if policy.budget is None:
+            return await self.app(scope, receive, send)
+
+        budget = BUDGETS[policy.budget]
+        key = f"{policy.budget}:{request_identity(scope, budget)}"
+        # Limite e restante em requisições desta rota (o orçamento é em unidades de custo)
+        limit = budget.limit // policy.cost
+
+        result = await rate_limiters[policy.budget].acheck(key, policy.cost)
+        if not result.allowed:
+            return await _too_many_requests(result.retry_after, limit)(scope, receive, send)
+
+        lease = None
+        if budget.max_concurrent:
+            lease = await concurrency_limiter.acquire(f"concurrent:{key}", budget.max_concurrent)
+            if lease is None:
+                response = _too_many_requests(
+                    RATE_LIMIT_CONCURRENCY_RETRY_AFTER, limit,
+                    detail="Too many concurrent requests. Please wait for the current ones to finish."
+                )
+                return await response(scope, receive, send)
+
+        rate_limit_headers = [
+            (b"x-ratelimit-limit", str(limit).encode()),
+            (b"x-ratelimit-remaining", str(result.remaining // policy.cost).encode()),
+        ]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + rate_limit_headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            # O app só retorna depois do corpo inteiro (streams SSE duram a geração toda)
+            if lease is not None:
+                await concurrency_limiter.release(lease)
+
+class ProcessTimeMiddleware:
+    """
+    Adiciona X-Process-Time: tempo até o início da resposta
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start_time = time.perf_counter()
+
+        async def send_with_time(message):
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                message["headers"] = list(message.get("headers", [])) + [(b"x-process-time", str(process_time).encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_time)
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, Text, ForeignKey, JSON, DateTime, UniqueConstraint, Index, LargeBinary, Numeric
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
+import uuid
 from .database import Base
 
 class User(Base):
@@ -10,13 +12,17 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
-    credits = Column(Integer, default=3)
+    credits = Column(Numeric(10, 2, asdecimal=False), default=3)  # Frações para regerar partes de um curso
+    plan = Column(String(20), default="free", server_default="free")  # Peso na fila de geração (PLAN_WEIGHTS)
     
     # Relacionamento com cursos
     courses = relationship("Course", back_populates="user")
 
 class Course(Base):
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_user_id_id", "user_id", "id"),  # Listagem paginada por usuário
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -29,6 +35,128 @@ class Course(Base):
     depth_level = Column(String)
     voice_tone = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Controle de concorrência otimista ao editar o conteúdo
     
     # Relacionamento com usuário
-    user = relationship("User", back_populates="courses")
\ No newline at end of file
+    user = relationship("User", back_populates="courses")
+
+    # Cópia normalizada do conteúdo (opcional; cursos antigos só têm o JSON até o backfill)
+    module_rows = relationship(
+        "CourseModule", back_populates="course", cascade="all, delete-orphan", order_by="CourseModule.position"
+    )
+    quiz_question_rows = relationship(
+        "CourseQuizQuestion", back_populates="course", cascade="all, delete-orphan", order_by="CourseQuizQuestion.position"
+    )
+
+class CourseModule(Base):
+    __tablename__ = "course_modules"
+    __table_args__ = (
+        UniqueConstraint("course_id", "position", name="uq_course_modules_course_position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)  # Índice do módulo em Course.modules
+    module_title = Column(String)
+    chapter = Column(String)
+    practice_activities = Column(JSON)
+
+    course = relationship("Course", back_populates="module_rows")
+    lessons = relationship(
+        "CourseLesson", back_populates="module", cascade="all, delete-orphan", order_by="CourseLesson.position"
+    )
+
+class CourseLesson(Base):
+    __tablename__ = "course_lessons"
+    __table_args__ = (
+        UniqueConstraint("module_id", "position", name="uq_course_lessons_module_position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    module_id = Column(Integer, ForeignKey("course_modules.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)  # Índice da aula no módulo
+    lesson_title = Column(String)
+    content = Column(Text)  # HTML da aula
+
+    module = relationship("CourseModule", back_populates="lessons")
+
+class CourseQuizQuestion(Base):
+    __tablename__ = "course_quiz_questions"
+    __table_args__ = (
+        UniqueConstraint("course_id", "position", name="uq_course_quiz_questions_course_position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    text = Column(Text)
+    alternatives = Column(JSON)
+
+    course = relationship("Course", back_populates="quiz_question_rows")
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+def _new_id():
+    return uuid.uuid4().hex
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_generation_jobs_user_idempotency_key"),
+    )
+
+    id = Column(String(32), primary_key=True, default=_new_id)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    status = Column(String, default="queued", index=True)  # queued | running | done | failed
+    kind = Column(String(20), default="course", server_default="course")  # course | translate | inline
+    request = Column(JSON)  # CourseRequest serializado (translate: course_id, language, provider)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Atualizado pelo worker enquanto roda
+    run_after = Column(DateTime(timezone=True), nullable=True)  # Job devolvido à fila só é reivindicado depois disso
+    idempotency_key = Column(String, nullable=True)  # Header Idempotency-Key do cliente
+    request_hash = Column(String(64), nullable=True, index=True)  # Chave normalizada do pedido (None se fresh)
+    reservation_id = Column(String(32), ForeignKey("credit_reservations.id"), nullable=True)
+
+    user = relationship("User")
+    course = relationship("Course")
+
+class CreditReservation(Base):
+    """
+    Crédito debitado e ainda não confirmado. Confirmado quando a geração
+    termina, devolvido quando falha ou quando expira sem renovação
+    """
+    __tablename__ = "credit_reservations"
+
+    id = Column(String(32), primary_key=True, default=_new_id)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    job_id = Column(String(32), nullable=True)
+    amount = Column(Numeric(10, 2, asdecimal=False))
+    status = Column(String, default="reserved", index=True)  # reserved | committed | released
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    expires_at = Column(DateTime(timezone=True), index=True)
+
+class GenerationLease(Base):
+    """
+    Trava de single-flight: só o job dono da linha gera o conteúdo
+    para aquele request_hash; os demais esperam o resultado
+    """
+    __tablename__ = "generation_leases"
+
+    request_hash = Column(String(64), primary_key=True)
+    job_id = Column(String(32), ForeignKey("generation_jobs.id"))
+    expires_at = Column(DateTime(timezone=True))
+
+class CoursePayload(Base):
+    __tablename__ = "course_payloads"
+
+    # Resposta de GET /courses/{id} já serializada, uma linha por codificação
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    encoding = Column(String(16), primary_key=True)  # gzip | br | zstd
+    etag = Column(String(80))  # "<sha256 do JSON>-<codificação>", entre aspas
+    body = Column(LargeBinary)
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
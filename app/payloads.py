@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import os
+from typing import Optional
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from . import models, schemas
+
+load_dotenv()
+
+# Compressões opcionais: usadas só se o pacote estiver instalado
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+BROTLI = "br"
+ZSTD = "zstd"
+
+# Ordem de preferência do servidor quando o cliente aceita várias com o mesmo q
+ENCODING_PREFERENCE = (BROTLI, ZSTD, GZIP)
+
+
+def _compressors() -> dict:
+    # Nível máximo: a compressão roda uma vez por curso, não por requisição
+    compressors = {GZIP: lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[BROTLI] = lambda body: brotli.compress(body, quality=11)
+    if zstandard is not None:
+        compressors[ZSTD] = lambda body: zstandard.ZstdCompressor(level=19).compress(body)
+    return compressors
+
+
+# Codificações guardadas por curso. Cada uma é mais uma cópia do curso no
+# banco (além das colunas JSON e das tabelas normalizadas), então o padrão é
+# só gzip: brotli/zstd economizam ~15-25% de banda por resposta, mas somam uma
+# linha inteira por curso. O gzip é sempre guardado (é a fonte da resposta sem compressão)
+COURSE_PAYLOAD_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COURSE_PAYLOAD_ENCODINGS", GZIP).split(",") if encoding.strip()
+]
+AVAILABLE_ENCODINGS = (GZIP,) + tuple(
+    encoding for encoding in _compressors() if encoding != GZIP and encoding in COURSE_PAYLOAD_ENCODINGS
+)
+
+
+def render_course(course: models.Course) -> bytes:
+    """
+    Bytes da resposta de GET /courses/{id}, iguais aos que o FastAPI geraria
+    com response_model=CourseResponse. O pydantic roda só aqui, uma vez por curso
+    """
+    data = schemas.CourseResponse.model_validate(course).model_dump(mode="json")
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def course_etag(body: bytes, encoding: str = IDENTITY) -> str:
+    # ETag forte por representação: cada codificação tem o seu
+    digest = hashlib.sha256(body).hexdigest()
+    if encoding == IDENTITY:
+        return f'"{digest}"'
+    return f'"{digest}-{encoding}"'
+
+
+def identity_etag(etag: str) -> str:
+    """
+    ETag da versão sem compressão, a partir do ETag de qualquer codificação
+    """
+    return '"' + etag.strip('"').split("-", 1)[0] + '"'
+
+
+def build_payloads(course: models.Course) -> list:
+    """
+    Só as versões comprimidas são guardadas; clientes sem compressão recebem
+    o gzip descomprimido (raro, e mais barato que serializar de novo)
+    """
+    body = render_course(course)
+    compressors = _compressors()
+    return [
+        models.CoursePayload(course_id=course.id, encoding=encoding, etag=course_etag(body, encoding), body=compressors[encoding](body))
+        for encoding in AVAILABLE_ENCODINGS
+    ]
+
+
+async def store_course_payloads(db: AsyncSession, course: models.Course) -> list:
+    """
+    Renderiza e adiciona à sessão as respostas pré-serializadas do curso.
+    O curso precisa ter id (flush antes); não faz commit
+    """
+    payloads = build_payloads(course)
+    db.add_all(payloads)
+    return payloads
+
+
+async def invalidate_course_payloads(db: AsyncSession, course_id: int):
+    await db.execute(delete(models.CoursePayload).where(models.CoursePayload.course_id == course_id))
+
+
+async def ensure_course_payloads(db: AsyncSession, course: models.Course) -> list:
+    """
+    Para cursos sem todas as respostas pré-serializadas (anteriores a elas, ou
+    de antes de instalar brotli/zstandard): refaz e salva na leitura.
+    Se outra requisição salvar antes, usa a dela
+    """
+    course_id = course.id
+    payloads = build_payloads(course)
+    await invalidate_course_payloads(db, course_id)
+    db.add_all(payloads)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        result = await db.execute(select(models.CoursePayload).where(models.CoursePayload.course_id == course_id))
+        payloads = result.scalars().all()
+    return payloads
+
+
+def decode_body(encoding: str, body: bytes) -> bytes:
+    if encoding == IDENTITY:
+        return body
+    if encoding == GZIP:
+        return gzip.decompress(body)
+    if encoding == BROTLI:
+        return brotli.decompress(body)
+    return zstandard.ZstdDecompressor().decompress(body)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available) -> Optional[str]:
+    """
+    Melhor codificação disponível segundo o Accept-Encoding (com q-values);
+    None quando o cliente não aceita nenhuma, e a resposta vai sem compressão
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in available:
+            continue
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Comparação fraca do If-None-Match (RFC 9110): lista de ETags ou *
+    """
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
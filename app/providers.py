@@ -0,0 +1,321 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+import httpx
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI = "openai"
+GEMINI = "gemini"
+FAKE = "fake"
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "o3-mini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+
+# Pool de conexões do processo: conexões TLS reaproveitadas entre gerações
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 300))  # Uma resposta pode levar minutos
+
+# Provedor falso, para testes de carga sem chamar APIs reais
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", 2))  # Segundos por resposta
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", 0.5))  # +- segundos, uniforme
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", 0))  # 0 a 1
+# Cauda lenta: essa fração das respostas leva FAKE_LLM_SLOW_LATENCY segundos
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", 0))
+FAKE_LLM_SLOW_LATENCY = float(os.getenv("FAKE_LLM_SLOW_LATENCY", 30))
+FAKE_LLM_LESSON_WORDS = int(os.getenv("FAKE_LLM_LESSON_WORDS", 350))
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")  # Fixa também a latência e as falhas
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class LLMProvider(ABC):
+    """
+    Interface dos provedores: complete devolve o texto inteiro, stream os
+    pedaços conforme chegam. Novas tentativas e circuit breaker ficam no
+    LLMClient; aqui só se classifica o que é erro transitório
+    """
+
+    name = ""
+
+    @abstractmethod
+    async def complete(self, prompt: str) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+    def is_transient(self, error: Exception) -> bool:
+        return False
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIProvider(LLMProvider):
+    name = OPENAI
+
+    def __init__(self, model: str = OPENAI_MODEL):
+        self.model = model
+        self._client = None
+
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                follow_redirects=True
+            )
+            # As novas tentativas são do LLMClient, não do SDK
+            self._client = openai.AsyncOpenAI(http_client=http_client, max_retries=0)
+        return self._client
+
+    async def complete(self, prompt: str) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": prompt}],
+        )
+        return response.choices[0].message.content
+
+    async def stream(self, prompt: str):
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": prompt}],
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def is_transient(self, error: Exception) -> bool:
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+        return False
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class GeminiProvider(LLMProvider):
+    name = GEMINI
+
+    def __init__(self, model: str = GEMINI_MODEL):
+        # SDK opcional, importado só quando o provedor é usado
+        try:
+            import google.generativeai as genai
+            from google.api_core import exceptions
+        except ImportError:
+            raise RuntimeError("Provedor gemini requer o pacote google-generativeai")
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model)
+        self._transient_errors = (exceptions.TooManyRequests, exceptions.ServerError, exceptions.DeadlineExceeded)
+
+    async def complete(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(error, self._transient_errors)
+
+
+class FakeProviderError(Exception):
+    """
+    Falha simulada pelo provedor falso (equivale a um 503 do provedor real)
+    """
+
+
+class FakeProvider(LLMProvider):
+    """
+    Responde JSON válido para cada prompt de generation.py (curso inteiro,
+    esboço, módulo, aula, questionário ou tradução) sem rede. O conteúdo depende só do
+    prompt; latência, jitter e taxa de falhas são configuráveis
+    """
+
+    name = FAKE
+
+    def __init__(self, latency: float = 2, jitter: float = 0.5, failure_rate: float = 0,
+                 slow_rate: float = 0, slow_latency: float = 30, lesson_words: int = 350, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.lesson_words = lesson_words
+        self._random = random.Random(seed)
+
+    def _delay(self) -> float:
+        latency = self.slow_latency if self._random.random() < self.slow_rate else self.latency
+        return max(latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def _maybe_fail(self):
+        if self._random.random() < self.failure_rate:
+            raise FakeProviderError("Falha simulada do provedor falso")
+
+    def _paragraphs(self, rng: random.Random, title: str) -> str:
+        words = ("conceito", "exemplo", "prática", "aplicação", "estrutura", "análise",
+                 "processo", "resultado", "método", "contexto", "detalhe", "etapa")
+        text = " ".join(rng.choice(words) for _ in range(self.lesson_words))
+        return f"<h2>{title}</h2><p>{text}.</p>"
+
+    def _lesson_titles(self, prompt: str) -> list:
+        match = re.search(r"nesta ordem:\n\n(.*?)\n\n", prompt, re.S)
+        if match is None:
+            return [f"Aula {index + 1}" for index in range(6)]
+        return [line[2:] for line in match.group(1).splitlines() if line.startswith("- ")]
+
+    def _module(self, rng: random.Random, index: int, title: str = None, chapter: str = None,
+                lesson_titles: list = None) -> dict:
+        lesson_titles = lesson_titles or [f"Aula {index + 1}.{lesson + 1}" for lesson in range(6)]
+        return {
+            "module_title": title or f"Módulo {index + 1}",
+            "chapter": chapter or f"Capítulo{index + 1}",
+            "lessons": [
+                {"lesson_title": lesson_title, "content": self._paragraphs(rng, lesson_title)}
+                for lesson_title in lesson_titles
+            ],
+            "practice_activities": [
+                {"title": "Atividade prática", "content": "<p>Aplique o conteúdo do módulo.</p>"}
+            ],
+        }
+
+    def _quiz(self, rng: random.Random) -> dict:
+        questions = []
+        for index in range(10):
+            correct = rng.randrange(4)
+            questions.append({
+                "text": f"Pergunta {index + 1}?",
+                "alternatives": [
+                    {"text": f"Alternativa {'ABCD'[alternative]}", "is_correct": alternative == correct}
+                    for alternative in range(4)
+                ],
+            })
+        return {
+            "final_summary": {"title": "Resumo Final", "content": "<p>Resumo do curso.</p>"},
+            "assessment_quiz": questions,
+        }
+
+    def _translate(self, value, language: str):
+        # Marca cada trecho de texto fora das tags, sem mexer no HTML
+        if isinstance(value, dict):
+            return {key: self._translate(item, language) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._translate(item, language) for item in value]
+        if isinstance(value, str):
+            return re.sub(r"(^|>)([^<]*[^<\s][^<]*)", lambda match: f"{match.group(1)}[{language}] {match.group(2)}", value)
+        return value
+
+    def respond(self, prompt: str) -> dict:
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+
+        if "Traduza o JSON abaixo" in prompt:
+            language_match = re.search(r"para \*\*(.+?)\*\*", prompt)
+            source = json.loads(prompt.split("JSON de origem:\n", 1)[1])
+            return self._translate(source, language_match.group(1) if language_match else "?")
+        topic_match = re.search(r"no tema \*\*(.+?)\*\*", prompt)
+        topic = topic_match.group(1) if topic_match else "Curso"
+
+        if "apenas planejar o curso" in prompt:
+            return {
+                "title": topic,
+                "subtitle": f"Introdução prática a {topic}",
+                "wallpaper": "",
+                "modules": [
+                    {
+                        "module_title": f"Módulo {index + 1}",
+                        "chapter": f"Capítulo{index + 1}",
+                        "lesson_titles": [f"Aula {index + 1}.{lesson + 1}" for lesson in range(6)],
+                    }
+                    for index in range(3)
+                ],
+            }
+
+        lesson_match = re.search(r"somente a Aula \d+ do Módulo \d+: (.+?)\*\*", prompt)
+        if lesson_match:
+            return {"lesson_title": lesson_match.group(1), "content": self._paragraphs(rng, lesson_match.group(1))}
+
+        module_match = re.search(r"somente o Módulo (\d+): (.+?)\*\*", prompt)
+        if module_match:
+            chapter_match = re.search(r'"chapter": "(.*?)"', prompt)
+            return self._module(
+                rng, int(module_match.group(1)) - 1, module_match.group(2),
+                chapter_match.group(1) if chapter_match else None, self._lesson_titles(prompt)
+            )
+
+        if "somente o resumo final e o questionário" in prompt:
+            return self._quiz(rng)
+
+        return {
+            "title": topic,
+            "subtitle": f"Introdução prática a {topic}",
+            "wallpaper": "",
+            "modules": [self._module(rng, index) for index in range(3)],
+            **self._quiz(rng),
+        }
+
+    async def complete(self, prompt: str) -> str:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return json.dumps(self.respond(prompt), ensure_ascii=False)
+
+    async def stream(self, prompt: str):
+        # A falha acontece antes do primeiro pedaço, e a latência se espalha pelo stream
+        delay = self._delay()
+        await asyncio.sleep(delay * 0.1)
+        self._maybe_fail()
+        text = json.dumps(self.respond(prompt), ensure_ascii=False)
+        chunk_size = 256
+        chunks = range(0, len(text), chunk_size)
+        for start in chunks:
+            await asyncio.sleep(delay * 0.9 / len(chunks))
+            yield text[start:start + chunk_size]
+
+    def is_transient(self, error: Exception) -> bool:
+        return isinstance(error, FakeProviderError)
+
+
+PROVIDERS = (OPENAI, GEMINI, FAKE)
+
+
+def create_provider(spec: str) -> LLMProvider:
+    """
+    Provedor a partir de "nome" ou "nome:modelo" (ex.: openai:gpt-4o-mini).
+    No provedor falso o "modelo" é a latência em segundos (ex.: fake:0.5)
+    """
+    name, _, model = spec.partition(":")
+    if name == OPENAI:
+        return OpenAIProvider(model or OPENAI_MODEL)
+    if name == GEMINI:
+        return GeminiProvider(model or GEMINI_MODEL)
+    if name == FAKE:
+        return FakeProvider(
+            latency=float(model) if model else FAKE_LLM_LATENCY, jitter=FAKE_LLM_JITTER,
+            failure_rate=FAKE_LLM_FAILURE_RATE, slow_rate=FAKE_LLM_SLOW_RATE, slow_latency=FAKE_LLM_SLOW_LATENCY,
+            lesson_words=FAKE_LLM_LESSON_WORDS, seed=FAKE_LLM_SEED
+        )
+    raise ValueError(f"Provedor de IA desconhecido: {spec}")
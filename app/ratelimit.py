@@ -0,0 +1,306 @@
+"""
+Armazenamento do estado do rate limiter (um float por cliente, o TAT do GCRA).
+
+Todo store expõe `update(key, fn)`: chama `fn(valor_atual_ou_None)`, que devolve
+`(novo_valor_ou_None, resultado)`, de forma atômica para a chave, e grava o
+novo valor se houver. O rate limiter não precisa saber onde o estado mora.
+`aupdate(key, fn)` é a versão para o event loop: nunca espera por um lock
+entre processos na thread do loop.
+"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem locks de região, só memory/sqlite
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _shm_path(name: str) -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, name)
+
+
+class MemoryStore:
+    """
+    Estado só deste processo: dicts em shards, cada um com o seu lock
+    """
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, shards: int = 64, max_keys: int = 200000):
+        self.max_keys_per_shard = max(1, max_keys // shards)
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self.evicted = 0
+
+    def update(self, key: str, fn):
+        # hash() basta: o estado é por processo
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+
+        with self._locks[index]:
+            value, result = fn(shard.get(key))
+            if value is not None:
+                if key not in shard and len(shard) >= self.max_keys_per_shard:
+                    # Shard cheio: descarta a chave mais antiga (ordem de inserção)
+                    del shard[next(iter(shard))]
+                    self.evicted += 1
+                shard[key] = value
+        return result
+
+    async def aupdate(self, key: str, fn):
+        # Locks só entre threads deste processo, seguros por pouquíssimo tempo
+        return self.update(key, fn)
+
+    def evict_idle(self) -> int:
+        """
+        Remove chaves ociosas (TAT no passado). Um shard por vez, para não
+        segurar nenhum lock por muito tempo
+        """
+        removed = 0
+        for index, shard in enumerate(self._shards):
+            now = self.clock()
+            with self._locks[index]:
+                idle = [key for key, tat in shard.items() if tat <= now]
+                for key in idle:
+                    del shard[key]
+            removed += len(idle)
+        self.evicted += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "keys": sum(len(shard) for shard in self._shards),
+            "evicted": self.evicted,
+        }
+
+
+class _BucketLock:
+    """
+    Lock de um bucket: primeiro o lock de thread (locks fcntl são por
+    processo e não excluem threads), depois o lock de região do arquivo.
+    Com blocking=False, OSError se algum dos dois estiver ocupado
+    """
+
+    def __init__(self, fd, thread_lock, start, length, blocking: bool = True):
+        self.fd = fd
+        self.thread_lock = thread_lock
+        self.start = start
+        self.length = length
+        self.blocking = blocking
+
+    def __enter__(self):
+        if not self.thread_lock.acquire(blocking=self.blocking):
+            raise BlockingIOError("bucket ocupado")
+        try:
+            flags = fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.lockf(self.fd, flags, self.length, self.start)
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.start)
+        finally:
+            self.thread_lock.release()
+
+
+class SharedMemoryStore:
+    """
+    Tabela hash de tamanho fixo num arquivo mapeado em memória (/dev/shm),
+    compartilhada por todos os workers do host.
+
+    A tabela é dividida em buckets de `BUCKET_SLOTS` slots (hash de 8 bytes +
+    TAT de 8 bytes). Cada chave mora num único bucket, protegido por um lock
+    de região (fcntl) entre processos e por um lock de thread dentro do
+    processo. Slots com TAT no passado contam como livres; com o bucket cheio,
+    o slot mais perto de ficar ocioso é reaproveitado.
+
+    Um arquivo existente com outro tamanho nunca é redimensionado (os workers
+    que já o mapearam levariam SIGBUS): RuntimeError. O caminho padrão leva
+    max_keys no nome, então outra configuração usa outro arquivo.
+    """
+    clock = staticmethod(time.time)  # Relógio comum a todos os processos
+
+    BUCKET_SLOTS = 16
+    SLOT = struct.Struct("<Qd")
+
+    def __init__(self, path: str, max_keys: int = 200000, thread_locks: int = 64):
+        if fcntl is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=shm requer fcntl (Linux/macOS)")
+
+        self.path = path
+        self.buckets = max(1, -(-max_keys // self.BUCKET_SLOTS))
+        self.bucket_size = self.BUCKET_SLOTS * self.SLOT.size
+        size = self.buckets * self.bucket_size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            current = os.fstat(self._fd).st_size
+            if current == 0:
+                # Arquivo novo: o primeiro processo dimensiona
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        if current not in (0, size):
+            os.close(self._fd)
+            raise RuntimeError(
+                f"{path} tem {current} bytes, esperado {size} (outro RATE_LIMIT_MAX_KEYS ainda em uso? use outro RATE_LIMIT_STORE_PATH)"
+            )
+        self._mm = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(thread_locks)]
+        self.evicted = 0
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Estável entre processos (hash() é aleatório por processo); 0 marca slot vazio
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") | 1
+
+    def _locked(self, bucket: int, blocking: bool = True):
+        return _BucketLock(
+            self._fd, self._locks[bucket % len(self._locks)], bucket * self.bucket_size, self.bucket_size, blocking
+        )
+
+    def update(self, key: str, fn, blocking: bool = True):
+        key_hash = self._hash(key)
+        bucket = key_hash % self.buckets
+        start = bucket * self.bucket_size
+        now = self.clock()
+
+        with self._locked(bucket, blocking):
+            free = None
+            oldest = None
+            target = None
+            current = None
+            for offset in range(start, start + self.bucket_size, self.SLOT.size):
+                slot_hash, tat = self.SLOT.unpack_from(self._mm, offset)
+                if slot_hash == key_hash:
+                    target, current = offset, tat
+                    break
+                if free is None and (slot_hash == 0 or tat <= now):
+                    free = offset
+                if oldest is None or tat < oldest[1]:
+                    oldest = (offset, tat)
+
+            value, result = fn(current)
+            if value is not None:
+                if target is None:
+                    target = free
+                if target is None:
+                    target = oldest[0]
+                    self.evicted += 1
+                self.SLOT.pack_into(self._mm, target, key_hash, value)
+        return result
+
+    async def aupdate(self, key: str, fn):
+        # Caminho comum: bucket livre, sem sair do loop. Com disputa, espera numa thread
+        try:
+            return self.update(key, fn, blocking=False)
+        except OSError:
+            return await asyncio.to_thread(self.update, key, fn)
+
+    def evict_idle(self) -> int:
+        removed = 0
+        for bucket in range(self.buckets):
+            start = bucket * self.bucket_size
+            now = self.clock()
+            with self._locked(bucket):
+                for offset in range(start, start + self.bucket_size, self.SLOT.size):
+                    slot_hash, tat = self.SLOT.unpack_from(self._mm, offset)
+                    if slot_hash and tat <= now:
+                        self.SLOT.pack_into(self._mm, offset, 0, 0.0)
+                        removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "backend": "shm",
+            "slots": self.buckets * self.BUCKET_SLOTS,
+            "evicted": self.evicted,
+        }
+
+
+class SQLiteStore:
+    """
+    Fallback sem /dev/shm nem fcntl: uma tabela SQLite em arquivo local,
+    compartilhada pelos processos do host. Cada verificação é uma transação
+    curta (BEGIN IMMEDIATE); em caso de erro a requisição é liberada
+    """
+    clock = staticmethod(time.time)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        self.errors = 0
+
+    def update(self, key: str, fn):
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                    value, result = fn(row[0] if row else None)
+                    if value is not None:
+                        self._conn.execute(
+                            "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                            "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                            (key, value)
+                        )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                return result
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("Falha no rate limit em SQLite (%s); requisição liberada", e)
+                return fn(None)[1]
+
+    async def aupdate(self, key: str, fn):
+        # BEGIN IMMEDIATE pode esperar até `timeout` por outro worker: fora do loop
+        return await asyncio.to_thread(self.update, key, fn)
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (self.clock(),))
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+        return {"backend": "sqlite", "keys": keys, "errors": self.errors}
+
+
+def create_store(backend: str, max_keys: int = 200000, shards: int = 64, path: str = None):
+    """
+    memory: por processo | shm: compartilhado entre workers via /dev/shm | sqlite: arquivo local.
+    Um arquivo shm de outro tamanho impede a inicialização (RuntimeError): cair
+    para outro backend deixaria os workers com estados separados
+    """
+    if backend == "memory":
+        return MemoryStore(shards=shards, max_keys=max_keys)
+    if backend == "shm":
+        if fcntl is None:
+            logger.warning("fcntl indisponível; rate limit usando SQLite")
+            return SQLiteStore(path or os.path.join(tempfile.gettempdir(), "lessonhub-ratelimit.sqlite3"))
+        return SharedMemoryStore(path or _shm_path(f"lessonhub-ratelimit-{max_keys}.shm"), max_keys=max_keys, thread_locks=shards)
+    if backend == "sqlite":
+        return SQLiteStore(path or os.path.join(tempfile.gettempdir(), "lessonhub-ratelimit.sqlite3"))
+    raise ValueError(f"RATE_LIMIT_BACKEND inválido: {backend}")
@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import schemas, models, utils
 from ..database import get_db
-from passlib.context import CryptContext
+from ..hashing import password_hasher
 
 router = APIRouter(tags=['Authentication'])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 @router.post('/login')
-def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_credentials.email).first()
+async def login(user_credentials: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user_credentials.email))
+    user = result.scalars().first()
     
     if not user:
         raise HTTPException(
@@ -18,7 +18,8 @@ def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
             detail=f"Invalid Credentials"
         )
     
-    if not pwd_context.verify(user_credentials.password, user.hashed_password):
+    # bcrypt é custoso de propósito; roda no pool de processos dedicado
+    if not await password_hasher.verify(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Invalid Credentials"
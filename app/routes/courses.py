@@ -1,283 +1,871 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from .. import schemas, models, utils
-from ..database import get_db
-import openai
-import os
-import json
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Response, Header, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from sqlalchemy import select, func, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, models, utils, generation, credits, payloads, blobs
+from ..database import get_db, AsyncSessionLocal
+from ..jobs import job_pool, job_scheduler, InlineSlot, DONE, TRANSLATE
+from ..llm import LLMClient, llm_client_for, LLMUnavailableError
+from ..streaming import IncrementalJSONParser, COURSE_STREAM_PATHS, INVALID, format_sse
 from dotenv import load_dotenv
-from typing import List
+from typing import List, Optional
 import asyncio
-import httpx
+import contextlib
+import json
+import os
 
 load_dotenv()
 
 router = APIRouter(tags=['Courses'])
 
-@router.post('/generate-course', response_model=schemas.CourseResponse)
+async def _idempotent_job(db: AsyncSession, user_id: int, idempotency_key: str, course_request: schemas.CourseRequest):
+    result = await db.execute(select(models.GenerationJob).where(
+        models.GenerationJob.user_id == user_id,
+        models.GenerationJob.idempotency_key == idempotency_key
+    ))
+    job = result.scalars().first()
+
+    # Normalizado pelo schema: jobs antigos não têm os campos adicionados depois
+    if job is not None and schemas.CourseRequest(**job.request).model_dump() != course_request.model_dump():
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key já utilizada com um pedido diferente"
+        )
+    return job
+
+@router.post('/generate-course', status_code=202, response_model=schemas.JobResponse)
 async def generate_course(
     course_request: schemas.CourseRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: models.User = Depends(utils.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Gera um curso completo usando a API da OpenAI e salva no banco de dados
+    Enfileira a geração de um curso e retorna o job imediatamente.
+    O andamento é consultado em GET /jobs/{job_id}.
+    Se o mesmo pedido já estiver no cache, o curso é criado na hora (job já `done`).
+    Repetições com o mesmo Idempotency-Key devolvem o job original sem cobrar de novo
     """
+    if idempotency_key:
+        existing = await _idempotent_job(db, current_user.id, idempotency_key, course_request)
+        if existing is not None:
+            response.status_code = 200
+            return existing
+
+    client = llm_client_for(course_request.provider)
+    cached = generation.get_cached_content(course_request)
+    if cached is None:
+        # Provedor de IA falhando ou fila longa demais: recusa já, sem cobrar nem enfileirar
+        client.ensure_available()
+        await job_scheduler.admit(db)
+
+    # Débito atômico + reserva na mesma transação que cria o job;
+    # o worker confirma a reserva ao salvar o curso ou a devolve se falhar
+    user_id = current_user.id
+    reservation = await credits.reserve(db, user_id)
+    if reservation is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Créditos insuficientes para gerar o curso"
+        )
+
+    job = models.GenerationJob(
+        user_id=user_id,
+        request=course_request.model_dump(),
+        idempotency_key=idempotency_key,
+        request_hash=None if course_request.fresh else generation.request_cache_key(course_request),
+        reservation_id=reservation.id
+    )
+
+    if cached is not None:
+        new_course = generation.build_course(cached, course_request, user_id)
+        db.add(new_course)
+        await db.flush()
+        await payloads.store_course_payloads(db, new_course)
+        job.status = DONE
+        job.course_id = new_course.id
+        await credits.commit_reservation(db, reservation.id)
+        response.status_code = 200
+
+    db.add(job)
     try:
-        if current_user.credits < 1:
-            raise HTTPException(
-                status_code=400,
-                detail="Créditos insuficientes para gerar o curso"
-            )
+        await db.flush()
+        reservation.job_id = job.id
+        await db.commit()
+    except IntegrityError:
+        # Requisição concorrente com a mesma chave venceu; o rollback desfaz o débito
+        await db.rollback()
+        existing = await _idempotent_job(db, user_id, idempotency_key, course_request)
+        if existing is None:
+            raise
+        response.status_code = 200
+        return existing
+    await db.refresh(job)
+
+    if cached is None:
+        job_pool.notify()
+
+    return job
+
+async def _release_credit(reservation_id: str):
+    async with AsyncSessionLocal() as db:
+        await credits.release_reservation(db, reservation_id)
+        await db.commit()
+
+async def _save_course(course_data: dict, course_request: schemas.CourseRequest, user_id: int, reservation_id: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        new_course = generation.build_course(course_data, course_request, user_id)
+        db.add(new_course)
+        await db.flush()
+        await payloads.store_course_payloads(db, new_course)
+        await credits.commit_reservation(db, reservation_id)
+        await db.commit()
+        return schemas.CourseResponse.model_validate(new_course).model_dump()
+
+def _place(items: list, index: int, value):
+    items.extend([None] * (index + 1 - len(items)))
+    items[index] = value
+
+def _collect_course_event(course_data: dict, path: tuple, value):
+    """
+    Guarda a parte do curso que acabou de fechar e devolve o evento SSE correspondente.
+    Módulos e questões ficam na posição do stream; um valor INVALID (ou que
+    não é objeto) não gera evento e deixa a seção inválida para o repair_course refazer
+    """
+    section = path[0]
 
-        # Deduzir créditos imediatamente para evitar race conditions
-        current_user.credits -= 1
-        db.commit()
+    if value is INVALID or (len(path) > 1 and not isinstance(value, dict)):
+        if section in ("modules", "assessment_quiz") and len(path) == 2:
+            _place(course_data[section], path[1], None)
+        return None
 
-        prompt = f"""
-Você é um assistente educacional com ampla experiência em design instrucional, criação de cursos online e ensino técnico no tema **{course_request.topic}**.
+    if section in ("title", "subtitle", "wallpaper"):
+        course_data[section] = value
+        if section == "wallpaper":
+            # Pode ser uma imagem em base64; vai apenas no evento final
+            return None
+        return section, {section: value}
 
-Sua tarefa é gerar um curso completo em **{course_request.language}**, com estrutura progressiva, clareza didática, e conteúdo aprofundado. Use o tom de voz: **{course_request.voice_tone}**.
+    if section == "modules" and len(path) == 4:
+        return "lesson", {"module_index": path[1], "lesson_index": path[3], **value}
 
-Geração de Imagem de Capa: {'Sim' if course_request.generate_cover_image else 'Não'}  
-Se 'Sim', crie uma descrição coerente com o tema. Caso contrário, ignore essa instrução.
+    if section == "modules":
+        _place(course_data["modules"], path[1], value)
+        module = {key: item for key, item in value.items() if key != "lessons"}
+        return "module", {"module_index": path[1], **module}
 
----
+    if section == "final_summary":
+        course_data["final_summary"] = value
+        return "final_summary", value
 
-## INSTRUÇÕES GERAIS DO CURSO
+    _place(course_data["assessment_quiz"], path[1], value)
+    return "quiz_question", {"index": path[1], **value}
 
-**Título:** Use [{course_request.topic}], corrigindo erros de escrita, se necessário.  
-**Subtítulo:** Crie um subtítulo conciso e cativante, destacando escopo ou benefício do curso.  
-**Imagem de capa:** Se aplicável, gere uma descrição coerente e relevante.
+def _section_events(course_data: dict, sections: list):
+    """
+    Eventos SSE das seções refeitas depois do stream (mesmo formato dos originais)
+    """
+    for section in sections:
+        if section == generation.QUIZ:
+            yield "final_summary", course_data["final_summary"]
+            for index, question in enumerate(course_data["assessment_quiz"]):
+                yield "quiz_question", {"index": index, **question}
+            continue
+        module = course_data["modules"][section]
+        for lesson_index, lesson in enumerate(module["lessons"]):
+            yield "lesson", {"module_index": section, "lesson_index": lesson_index, **lesson}
+        yield "module", {"module_index": section, **{key: item for key, item in module.items() if key != "lessons"}}
+
+class _CleanupStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que roda `cleanup` quando a resposta termina de qualquer
+    jeito. O finally do gerador não basta: se o cliente desconecta antes do
+    corpo começar, o gerador nunca é iniciado e o finally não roda
+    """
 
----
+    def __init__(self, *args, cleanup, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cleanup = cleanup
 
-## ESTRUTURA DO CURSO
-
-- O curso deve conter **3 módulos sequenciais**, com dificuldade crescente.
-- Cada módulo deve conter:
-  - `"module_title"`: Um nome claro e descritivo
-  - `"chapter"`: Uma palavra curta (1 palavra) que represente o módulo (para menu lateral)
-  - **6 aulas**, com títulos relevantes e conteúdo técnico crescente
-- Cada aula deve ter:
-  - `"lesson_title"`: Um título direto e informativo
-  - `"content"`: HTML entre **300 e 400 palavras**, estruturado, com ensino progressivo e detalhado.
-
----
-
-## ORIENTAÇÕES PARA AS AULAS
-
-### 1. Início da Aula
-- Comece **diretamente com o conteúdo**.
-- **Proibido** o uso de frases introdutórias como: "Nesta aula veremos", "Agora que já estudamos...", ou similares.
-
-### 2. Desenvolvimento
-- Apresente o conceito central com profundidade
-- Contextualize com aplicações práticas
-- Conecte com o que foi aprendido nos módulos anteriores
-- Inclua explicações claras, comparações, estudos de caso e dicas
-- Evite explicações genéricas ou superficiais
-
-### 3. Estrutura HTML
-Use HTML organizado e visualmente agradável:
-
-- `<strong style="display:block; margin-top:1.5rem; margin-bottom:1.5rem;">`: para subtópicos internos visuais  
-- `<ul>` e `<li>`: quando for listar pontos ou enumerar itens
-- `<code>` ou `<pre>`: para comandos, trechos técnicos ou sintaxes  
-- `<strong>` e `<em>`: para destaques importantes em frases  
-- `<p>`: apenas para parágrafos (nunca encapsule tudo em um único `<p>`)  
-- `<br>`: para quebras de linha pontuais onde necessário  
-
-### 4. Exemplos e Analogias
-- Sempre que possível, inclua **exemplos reais e contextualizados**
-- Use analogias para facilitar a compreensão de tópicos mais abstratos
-
----
-
-## EXERCÍCIOS PRÁTICOS
-
-- Ao final de cada módulo (ou em uma aula estratégica), inclua uma **atividade prática** com **150 a 160 palavras** em HTML
-- Tipos de atividade: exercícios, estudo de caso ou quiz rápido
-- Sempre que possível, forneça gabarito ou sugestão de resposta comentada
-
----
-
-## RESUMO FINAL DO CURSO
-
-- Escreva um **resumo com cerca de 150 palavras**, em HTML
-- Recapitule os principais pontos e aprendizados
-
----
-
-## QUESTIONÁRIO FINAL
-
-- Elabore **10 perguntas de múltipla escolha**
-- Cada pergunta deve conter **4 alternativas**, com **apenas uma correta**
-- Use linguagem clara, objetiva e alinhada com o conteúdo ensinado
-
----
-
-## FORMATO DE SAÍDA
-
-A resposta deve ser **exclusivamente um JSON** com a estrutura abaixo. Não inclua texto extra:
-
-{{
-  "title": "<Título do Curso>",
-  "subtitle": "<Subtítulo do Curso>",
-  "wallpaper": "<Base64 ou string vazia>",
-  "modules": [
-    {{
-      "module_title": "Título do Módulo",
-      "chapter": "NomeDoCapitulo",
-      "lessons": [
-        {{
-          "lesson_title": "Título da Aula",
-          "content": "<Conteúdo da aula em HTML, com estrutura progressiva e exemplos práticos>"
-        }}
-        ...
-      ],
-      "practice_activities": [
-        {{
-          "title": "Título da Atividade",
-          "content": "<Conteúdo em HTML>"
-        }}
-      ]
-    }}
-    ...
-  ],
-  "final_summary": {{
-    "title": "Resumo Final",
-    "content": "<Resumo do curso em HTML>"
-  }},
-  "assessment_quiz": [
-    {{
-      "text": "Pergunta 1?",
-      "alternatives": [
-        {{ "text": "Alternativa A", "is_correct": false }},
-        {{ "text": "Alternativa B", "is_correct": true }},
-        {{ "text": "Alternativa C", "is_correct": false }},
-        {{ "text": "Alternativa D", "is_correct": false }}
-      ]
-    }}
-    ...
-  ]
-}}
-
----
-
-**IMPORTANTE:**  
-- Responda apenas com o JSON acima.  
-- Não inclua comentários, explicações ou textos adicionais.  
-- Preencha todos os campos com conteúdo real e coerente.  
-- O campo `"title"` é obrigatório.
-"""
-
-
-        # Configurar timeout para a chamada da OpenAI
-        client = openai.OpenAI()
-        
-        # Usar timeout para evitar que a operação fique travada
+    async def __call__(self, scope, receive, send):
         try:
-            response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    client.chat.completions.create,
-                    model="o3-mini",
-                    messages=[
-                        {"role": "system", "content": prompt}
-                    ],
-                ),
-                timeout=300  # 5 minutos de timeout
-            )
-        except asyncio.TimeoutError:
-            # Se timeout, reembolsar o crédito
-            current_user.credits += 1
-            db.commit()
-            raise HTTPException(
-                status_code=408,
-                detail="Timeout na geração do curso. Tente novamente."
-            )
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.cleanup()
+
+async def _replay_cached(cached: dict):
+    yield json.dumps(cached, ensure_ascii=False)
+
+async def _course_event_stream(client: LLMClient, course_request: schemas.CourseRequest, user_id: int, reservation_id: str, cached: dict = None, slot: InlineSlot = None):
+    saved = False
+    course_data = {"modules": [], "assessment_quiz": []}
+    parser = IncrementalJSONParser(COURSE_STREAM_PATHS)
 
-        response_text = response.choices[0].message.content
+    if cached is not None:
+        # Cache hit: os mesmos eventos, sem chamar a IA
+        source = _replay_cached(cached)
+    else:
+        source = generation.stream_course_content(course_request)
+
+    try:
+        # A vaga na fila global vale só enquanto a IA está gerando
+        async with slot or contextlib.nullcontext():
+            async with asyncio.timeout(generation.GENERATION_TIMEOUT):
+                async for text in source:
+                    for path, value in parser.feed(text):
+                        event = _collect_course_event(course_data, path, value)
+                        if event:
+                            yield format_sse(*event)
+                    if parser.done:
+                        break
+
+            incomplete = ()
+            if not parser.done and ("final_summary" in course_data or course_data["assessment_quiz"]):
+                # Cortada no questionário: as questões recebidas podem não ser todas
+                incomplete = (generation.QUIZ,)
+            # Seções inválidas ou que não chegaram são geradas de novo e enviadas em seguida
+            course_data, repaired = await generation.repair_course(client, course_request, course_data, incomplete)
+            for event in _section_events(course_data, repaired):
+                yield format_sse(*event)
+
+        course = await _save_course(course_data, course_request, user_id, reservation_id)
+        saved = True
+        if cached is None:
+            generation.cache_content(course_request, course_data)
+        yield format_sse("course", course)
+
+    except TimeoutError:
+        yield format_sse("error", {"detail": "Timeout na geração do curso. Tente novamente."})
+    except LLMUnavailableError as e:
+        yield format_sse("error", {"detail": str(e)})
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        yield format_sse("error", {"detail": f"Erro ao processar resposta da IA: {str(e)}"})
+    except Exception as e:
+        yield format_sse("error", {"detail": f"Erro ao gerar curso: {str(e)}"})
+    finally:
+        # Qualquer falha (inclusive cliente desconectado) devolve o crédito reservado
+        if not saved:
+            await _release_credit(reservation_id)
+
+@router.post('/generate-course/stream')
+async def generate_course_stream(
+    course_request: schemas.CourseRequest,
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Gera um curso enviando cada aula, módulo, resumo e questão do questionário
+    como evento SSE assim que ficam prontos. O evento final `course` traz o curso salvo.
+    Nenhuma conexão do banco fica presa durante a geração
+    """
+    client = llm_client_for(course_request.provider)
+    cached = generation.get_cached_content(course_request)
+    if cached is None:
+        client.ensure_available()
+        await job_scheduler.admit(db)
+
+    user_id = current_user.id
+    reservation = await credits.reserve(db, user_id)
+    if reservation is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Créditos insuficientes para gerar o curso"
+        )
+    reservation_id = reservation.id
+    await db.commit()
 
+    slot = None
+    if cached is None:
+        # Conta no limite global de gerações e entra na fila justa como um job
+        slot = InlineSlot(user_id)
         try:
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```", 1)[0]
-            elif "```" in response_text:
-                response_text = response_text.split("```", 1)[1]
-
-            course_data = json.loads(response_text.strip())
-
-            new_course = models.Course(
-                title=course_data["title"],
-                subtitle=course_data["subtitle"],
-                wallpaper=course_data["wallpaper"],
-                modules=course_data["modules"],
-                final_summary=course_data["final_summary"],
-                assessment_quiz=course_data["assessment_quiz"],
-                language=course_request.language,
-                depth_level=course_request.depth_level,
-                voice_tone=course_request.voice_tone,
-                user_id=current_user.id
-            )
+            await slot.acquire()
+        except BaseException:
+            await _release_credit(reservation_id)
+            raise
+
+    async def cleanup():
+        # Idempotente: depois do stream completo a vaga já saiu e a reserva já foi confirmada
+        if slot is not None:
+            await slot.release()
+        await _release_credit(reservation_id)
+
+    return _CleanupStreamingResponse(
+        _course_event_stream(client, course_request, user_id, reservation_id, cached, slot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        cleanup=cleanup
+    )
+
+MY_COURSES_PAGE_SIZE = 50
+MY_COURSES_MAX_PAGE_SIZE = 200
+
+@router.get('/my-courses', response_model=List[schemas.CourseList])
+async def get_my_courses(
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Cursor: id do último curso da página anterior"),
+    limit: int = Query(MY_COURSES_PAGE_SIZE, ge=1, le=MY_COURSES_MAX_PAGE_SIZE),
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lista os cursos do usuário autenticado (apenas id e título), em ordem de id.
+    Paginação por cursor: se houver mais cursos, o header X-Next-After-Id traz
+    o valor de `after_id` da próxima página
+    """
+    query = select(models.Course.id, models.Course.title).where(models.Course.user_id == current_user.id)
+    if after_id is not None:
+        query = query.where(models.Course.id > after_id)
+    # Um a mais para saber se existe próxima página
+    result = await db.execute(query.order_by(models.Course.id).limit(limit + 1))
+    courses = result.all()
 
-            db.add(new_course)
-            db.commit()
-            db.refresh(new_course)
+    if len(courses) > limit:
+        courses = courses[:limit]
+        response.headers["X-Next-After-Id"] = str(courses[-1].id)
+    return [{"id": course.id, "title": course.title} for course in courses]
 
-            return new_course
+COURSE_CACHE_CONTROL = "private, no-cache"  # Sempre revalida com If-None-Match
 
-        except json.JSONDecodeError as e:
-            # Se erro no JSON, reembolsar o crédito
-            current_user.credits += 1
-            db.commit()
+@router.get('/courses/{course_id}', response_model=schemas.CourseResponse)
+async def get_course(
+    course_id: int,
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Busca um curso específico pelo ID (apenas se o usuário for o dono).
+    Devolve a resposta pré-serializada e pré-comprimida conforme o
+    Accept-Encoding, com ETag; If-None-Match igual responde 304
+    """
+    # Codificação escolhida só pelo Accept-Encoding: uma consulta no caminho comum
+    encoding = payloads.negotiate_encoding(accept_encoding, payloads.AVAILABLE_ENCODINGS)
+    source = encoding or payloads.GZIP  # Sem compressão aceita: descomprime o gzip guardado
+    owned_payload = (
+        select(models.CoursePayload.etag, models.CoursePayload.body)
+        .join(models.Course, models.Course.id == models.CoursePayload.course_id)
+        .where(
+            models.CoursePayload.course_id == course_id,
+            models.CoursePayload.encoding == source,
+            models.Course.user_id == current_user.id
+        )
+    )
+
+    def response_headers(stored_etag: str) -> dict:
+        etag = stored_etag if encoding else payloads.identity_etag(stored_etag)
+        return {"ETag": etag, "Cache-Control": COURSE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+    if if_none_match:
+        # Só o ETag: no 304 o corpo nem sai do banco
+        stored_etag = await db.scalar(owned_payload.with_only_columns(models.CoursePayload.etag))
+        if stored_etag is not None:
+            headers = response_headers(stored_etag)
+            if payloads.etag_matches(if_none_match, headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+
+    payload = (await db.execute(owned_payload)).first()
+    if payload is None:
+        result = await db.execute(select(models.Course).where(
+            models.Course.id == course_id,
+            models.Course.user_id == current_user.id
+        ))
+        course = result.scalars().first()
+
+        if not course:
             raise HTTPException(
-                status_code=500,
-                detail=f"Erro ao processar resposta da IA: {str(e)}"
+                status_code=404,
+                detail="Curso não encontrado ou você não tem permissão para acessá-lo"
             )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        # Em caso de erro geral, tentar reembolsar o crédito
+        # Curso sem esta representação guardada: gera agora, uma vez
+        course_payloads = await payloads.ensure_course_payloads(db, course)
+        payload = next(item for item in course_payloads if item.encoding == source)
+
+    headers = response_headers(payload.etag)
+    if if_none_match and payloads.etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        body = payload.body
+    else:
+        body = payloads.decode_body(source, payload.body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+WALLPAPER_CACHE_CONTROL = "private, max-age=31536000, immutable"  # A URL muda junto com o conteúdo
+WALLPAPER_CHUNK_SIZE = 64 * 1024
+
+# Atrás do nginx: com um prefixo (location internal apontando para BLOB_STORE_DIR),
+# a API só autoriza e o nginx envia o arquivo com sendfile
+BLOB_X_ACCEL_PREFIX = os.getenv("BLOB_X_ACCEL_PREFIX")
+
+def _byte_range(range_header: str, size: int):
+    """
+    (início, fim) inclusivos de um Range "bytes=" com um único intervalo.
+    None quando o cabeçalho não é suportado (responde o arquivo inteiro);
+    ValueError quando o intervalo não cabe no arquivo (416)
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = max(size - int(last), 0)  # Sufixo: os últimos N bytes
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end or (not first and not last):
+        raise ValueError(range_header)
+    return start, min(end, size - 1)
+
+def _file_chunks(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(WALLPAPER_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@router.get('/courses/{course_id}/wallpaper')
+async def get_course_wallpaper(
+    course_id: int,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    sig: Optional[str] = Query(None, description="Assinatura da URL que vem no campo `wallpaper` do curso"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Imagem de capa do curso, lida do blob store. Sem header Authorization
+    (funciona em <img src> e CSS url()): o acesso vem da URL assinada que o
+    dono recebe no curso. Suporta If-None-Match (304) e Range de um intervalo (206)
+    """
+    wallpaper = await db.scalar(select(models.Course.wallpaper).where(models.Course.id == course_id))
+    name = blobs.wallpaper_blob(wallpaper)
+    if name is not None and not blobs.valid_wallpaper_signature(course_id, name, sig):
+        name = None
+    path = blobs.blob_store.get_path(name) if name else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Capa não encontrada")
+
+    etag = f'"{name.split(".", 1)[0]}"'  # O nome já é o hash do conteúdo
+    headers = {"ETag": etag, "Cache-Control": WALLPAPER_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if if_none_match and payloads.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = blobs.media_type(name)
+    if BLOB_X_ACCEL_PREFIX:
+        # O nginx trata Range e condicionais a partir daqui
+        relative = os.path.relpath(path, blobs.blob_store.root)
+        headers["X-Accel-Redirect"] = BLOB_X_ACCEL_PREFIX.rstrip("/") + "/" + relative
+        return Response(media_type=media_type, headers=headers)
+
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    if range_header and (not if_range or if_range.strip() == etag):
         try:
-            current_user.credits += 1
-            db.commit()
-        except:
-            pass
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _file_chunks(path, start, end - start + 1),
+                status_code=206, media_type=media_type, headers=headers
+            )
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+async def _owned_course_header(db: AsyncSession, course_id: int, user_id: int):
+    # Só as colunas leves: sem o JSON do conteúdo nem a capa
+    result = await db.execute(
+        select(
+            models.Course.id, models.Course.title, models.Course.subtitle,
+            models.Course.language, models.Course.depth_level, models.Course.voice_tone, models.Course.version
+        ).where(models.Course.id == course_id, models.Course.user_id == user_id)
+    )
+    course = result.first()
+    if course is None:
         raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao gerar curso: {str(e)}"
+            status_code=404,
+            detail="Curso não encontrado ou você não tem permissão para acessá-lo"
         )
+    return course
 
-@router.get('/my-courses', response_model=List[schemas.CourseList])
-def get_my_courses(
+@router.get('/courses/{course_id}/outline', response_model=schemas.CourseOutline)
+async def get_course_outline(
+    course_id: int,
     current_user: models.User = Depends(utils.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Lista todos os cursos do usuário autenticado (apenas id e título)
+    Estrutura do curso (módulos e títulos das aulas), sem o conteúdo das aulas
     """
-    courses = db.query(models.Course).filter(models.Course.user_id == current_user.id).all()
-    return courses 
+    course = await _owned_course_header(db, course_id, current_user.id)
 
-@router.get('/courses/{course_id}', response_model=schemas.CourseResponse)
-def get_course(
+    result = await db.execute(
+        select(
+            models.CourseModule.position, models.CourseModule.module_title, models.CourseModule.chapter,
+            models.CourseLesson.position, models.CourseLesson.lesson_title
+        )
+        .outerjoin(models.CourseLesson, models.CourseLesson.module_id == models.CourseModule.id)
+        .where(models.CourseModule.course_id == course_id)
+        .order_by(models.CourseModule.position, models.CourseLesson.position)
+    )
+    modules = {}
+    for module_index, module_title, chapter, lesson_index, lesson_title in result.all():
+        module = modules.setdefault(module_index, {
+            "index": module_index, "module_title": module_title, "chapter": chapter, "lessons": []
+        })
+        if lesson_index is not None:
+            module["lessons"].append({"index": lesson_index, "lesson_title": lesson_title})
+
+    if modules:
+        quiz_questions = await db.scalar(
+            select(func.count(models.CourseQuizQuestion.id)).where(models.CourseQuizQuestion.course_id == course_id)
+        )
+        modules = list(modules.values())
+    else:
+        # Curso ainda sem as tabelas normalizadas: monta a partir do JSON
+        result = await db.execute(
+            select(models.Course.modules, models.Course.assessment_quiz).where(models.Course.id == course_id)
+        )
+        course_modules, assessment_quiz = result.one()
+        modules = [
+            {
+                "index": module_index,
+                "module_title": module["module_title"],
+                "chapter": module["chapter"],
+                "lessons": [
+                    {"index": lesson_index, "lesson_title": lesson["lesson_title"]}
+                    for lesson_index, lesson in enumerate(module["lessons"])
+                ]
+            }
+            for module_index, module in enumerate(course_modules or [])
+        ]
+        quiz_questions = len(assessment_quiz or [])
+
+    return {**course._asdict(), "modules": modules, "quiz_questions": quiz_questions}
+
+@router.get('/courses/{course_id}/modules/{module_index}/lessons/{lesson_index}', response_model=schemas.CourseLessonResponse)
+async def get_course_lesson(
     course_id: int,
+    module_index: int,
+    lesson_index: int,
     current_user: models.User = Depends(utils.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Busca um curso específico pelo ID (apenas se o usuário for o dono)
+    Uma aula do curso (índices a partir de 0, como em GET /courses/{id}/outline)
     """
-    course = db.query(models.Course).filter(
+    result = await db.execute(
+        select(models.CourseModule.module_title, models.CourseLesson.lesson_title, models.CourseLesson.content)
+        .join(models.CourseLesson, models.CourseLesson.module_id == models.CourseModule.id)
+        .join(models.Course, models.Course.id == models.CourseModule.course_id)
+        .where(
+            models.Course.id == course_id,
+            models.Course.user_id == current_user.id,
+            models.CourseModule.position == module_index,
+            models.CourseLesson.position == lesson_index
+        )
+    )
+    row = result.first()
+
+    if row is None:
+        # Curso não normalizado (ou aula inexistente): procura no JSON
+        result = await db.execute(select(models.Course.modules).where(
+            models.Course.id == course_id,
+            models.Course.user_id == current_user.id
+        ))
+        course_modules = result.scalar_one_or_none()
+        if course_modules is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Curso não encontrado ou você não tem permissão para acessá-lo"
+            )
+        try:
+            if module_index < 0 or lesson_index < 0:
+                raise IndexError
+            module = course_modules[module_index]
+            lesson = module["lessons"][lesson_index]
+        except IndexError:
+            raise HTTPException(status_code=404, detail="Aula não encontrada")
+        row = (module["module_title"], lesson["lesson_title"], lesson["content"])
+
+    module_title, lesson_title, content = row
+    return {
+        "course_id": course_id,
+        "module_index": module_index,
+        "lesson_index": lesson_index,
+        "module_title": module_title,
+        "lesson_title": lesson_title,
+        "content": content,
+    }
+
+@router.post('/courses/{course_id}/translate', status_code=202, response_model=schemas.JobResponse)
+async def translate_course(
+    course_id: int,
+    language: str = Query(..., min_length=2, max_length=50),
+    provider: Optional[str] = Query(None),
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Enfileira a tradução de um curso para outro idioma. O resultado é um
+    curso novo (consulte o job em GET /jobs/{job_id}); o original não muda.
+    Custa TRANSLATION_COST créditos, menos que gerar o curso de novo
+    """
+    client = llm_client_for(provider)
+    source_language = await db.scalar(select(models.Course.language).where(
         models.Course.id == course_id,
         models.Course.user_id == current_user.id
-    ).first()
-    
-    if not course:
+    ))
+    if source_language is None:
         raise HTTPException(
             status_code=404,
             detail="Curso não encontrado ou você não tem permissão para acessá-lo"
         )
-    
-    return course 
\ No newline at end of file
+    if generation.same_language(source_language, language):
+        raise HTTPException(status_code=422, detail=f"O curso já está em {source_language}")
+
+    client.ensure_available()
+    await job_scheduler.admit(db)
+
+    reservation = await credits.reserve(db, current_user.id, credits.TRANSLATION_COST)
+    if reservation is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Créditos insuficientes para traduzir o curso"
+        )
+    job = models.GenerationJob(
+        user_id=current_user.id,
+        kind=TRANSLATE,
+        request={"course_id": course_id, "language": language.strip(), "provider": provider},
+        reservation_id=reservation.id
+    )
+    db.add(job)
+    await db.flush()
+    reservation.job_id = job.id
+    await db.commit()
+    await db.refresh(job)
+
+    job_pool.notify()
+    return job
+
+async def _editable_course(db: AsyncSession, course_id: int, user_id: int, expected_version: Optional[int]):
+    result = await db.execute(
+        select(
+            models.Course.title, models.Course.subtitle, models.Course.modules, models.Course.version,
+            models.Course.language, models.Course.depth_level, models.Course.voice_tone
+        ).where(models.Course.id == course_id, models.Course.user_id == user_id)
+    )
+    course = result.first()
+    if course is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Curso não encontrado ou você não tem permissão para acessá-lo"
+        )
+    if expected_version is not None and expected_version != course.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"O curso foi alterado (versão atual: {course.version}). Recarregue e tente novamente."
+        )
+    return course
+
+def _course_request(course, provider: Optional[str]) -> schemas.CourseRequest:
+    return schemas.CourseRequest(
+        topic=course.title,
+        language=course.language,
+        depth_level=course.depth_level,
+        voice_tone=course.voice_tone,
+        provider=provider
+    )
+
+async def _charge_and_generate(db: AsyncSession, user_id: int, cost: float, generate):
+    """
+    Reserva `cost` créditos, roda a geração numa vaga da fila global e devolve
+    (reserva, resultado). Qualquer falha devolve o crédito
+    """
+    reservation = await credits.reserve(db, user_id, cost)
+    if reservation is None:
+        await db.rollback()
+        generate.close()
+        raise HTTPException(
+            status_code=400,
+            detail="Créditos insuficientes para regerar esta parte do curso"
+        )
+    reservation_id = reservation.id
+    await db.commit()
+
+    try:
+        async with InlineSlot(user_id):
+            result = await generate
+        return reservation_id, result
+    except HTTPException:
+        # Sem vaga na fila (503): a geração nem começou
+        generate.close()
+        await _release_credit(reservation_id)
+        raise
+    except TimeoutError:
+        await _release_credit(reservation_id)
+        raise HTTPException(status_code=504, detail="Timeout na geração. Tente novamente.")
+    except LLMUnavailableError as e:
+        await _release_credit(reservation_id)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(int(e.retry_after), 1))})
+    except (json.JSONDecodeError, ValueError) as e:
+        await _release_credit(reservation_id)
+        raise HTTPException(status_code=502, detail=f"Erro ao processar resposta da IA: {str(e)}")
+    except Exception as e:
+        # Erro do provedor depois das novas tentativas
+        await _release_credit(reservation_id)
+        raise HTTPException(status_code=502, detail=f"Erro ao gerar conteúdo: {str(e)}")
+    except BaseException:
+        # Cancelada (ex.: cliente desconectou); pode não ter começado
+        generate.close()
+        await _release_credit(reservation_id)
+        raise
+
+async def _save_modules(db: AsyncSession, course_id: int, version: int, modules: list, reservation_id: str) -> int:
+    """
+    Grava os módulos só se o curso ainda estiver na versão lida antes da
+    geração (senão 409 e o crédito volta). Não faz commit
+    """
+    result = await db.execute(
+        update(models.Course)
+        .where(models.Course.id == course_id, models.Course.version == version)
+        .values(modules=modules, version=models.Course.version + 1)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        await _release_credit(reservation_id)
+        raise HTTPException(
+            status_code=409,
+            detail="O curso foi alterado durante a geração. Recarregue e tente novamente."
+        )
+    # GET /courses/{id} refaz as respostas pré-serializadas na próxima leitura
+    await payloads.invalidate_course_payloads(db, course_id)
+    await credits.commit_reservation(db, reservation_id)
+    return version + 1
+
+@router.post('/courses/{course_id}/modules/{module_index}/regenerate', response_model=schemas.CourseModuleRegenerateResponse)
+async def regenerate_course_module(
+    course_id: int,
+    module_index: int,
+    regenerate_request: Optional[schemas.RegenerateRequest] = None,
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Gera de novo um módulo do curso (mesmos títulos de aulas), enviando à IA
+    só o esboço do curso. Custa MODULE_REGENERATION_COST créditos. Com
+    `version` no corpo, responde 409 se o curso mudou desde então
+    """
+    regenerate_request = regenerate_request or schemas.RegenerateRequest()
+    client = llm_client_for(regenerate_request.provider)
+    course = await _editable_course(db, course_id, current_user.id, regenerate_request.version)
+    modules = list(course.modules or [])
+    if not 0 <= module_index < len(modules):
+        raise HTTPException(status_code=404, detail="Módulo não encontrado")
+
+    client.ensure_available()
+    await job_scheduler.admit(db)
+    outline = generation.course_outline(course.title, course.subtitle, modules)
+    reservation_id, module = await _charge_and_generate(
+        db, current_user.id, credits.MODULE_REGENERATION_COST,
+        generation.regenerate_module(client, _course_request(course, regenerate_request.provider), outline, module_index)
+    )
+
+    modules[module_index] = module
+    version = await _save_modules(db, course_id, course.version, modules, reservation_id)
+    module_id = await db.scalar(select(models.CourseModule.id).where(
+        models.CourseModule.course_id == course_id,
+        models.CourseModule.position == module_index
+    ))
+    if module_id is not None:
+        # Cópia normalizada acompanha o JSON
+        await db.execute(
+            update(models.CourseModule)
+            .where(models.CourseModule.id == module_id)
+            .values(module_title=module["module_title"], chapter=module["chapter"], practice_activities=module["practice_activities"])
+        )
+        await db.execute(delete(models.CourseLesson).where(models.CourseLesson.module_id == module_id))
+        db.add_all([
+            models.CourseLesson(module_id=module_id, position=lesson_index, lesson_title=lesson["lesson_title"], content=lesson["content"])
+            for lesson_index, lesson in enumerate(module["lessons"])
+        ])
+    await db.commit()
+
+    return {"course_id": course_id, "module_index": module_index, "version": version, "module": module}
+
+@router.post('/courses/{course_id}/modules/{module_index}/lessons/{lesson_index}/regenerate', response_model=schemas.CourseLessonRegenerateResponse)
+async def regenerate_course_lesson(
+    course_id: int,
+    module_index: int,
+    lesson_index: int,
+    regenerate_request: Optional[schemas.RegenerateRequest] = None,
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Gera de novo o conteúdo de uma aula (mesmo título), enviando à IA o
+    esboço do curso e os títulos das aulas vizinhas. Custa
+    LESSON_REGENERATION_COST créditos; `version` como no módulo
+    """
+    regenerate_request = regenerate_request or schemas.RegenerateRequest()
+    client = llm_client_for(regenerate_request.provider)
+    course = await _editable_course(db, course_id, current_user.id, regenerate_request.version)
+    modules = list(course.modules or [])
+    if not 0 <= module_index < len(modules) or not 0 <= lesson_index < len(modules[module_index]["lessons"]):
+        raise HTTPException(status_code=404, detail="Aula não encontrada")
+
+    client.ensure_available()
+    await job_scheduler.admit(db)
+    outline = generation.course_outline(course.title, course.subtitle, modules)
+    reservation_id, lesson = await _charge_and_generate(
+        db, current_user.id, credits.LESSON_REGENERATION_COST,
+        generation.regenerate_lesson(client, _course_request(course, regenerate_request.provider), outline, module_index, lesson_index)
+    )
+
+    module = {**modules[module_index], "lessons": list(modules[module_index]["lessons"])}
+    module["lessons"][lesson_index] = lesson
+    modules[module_index] = module
+    version = await _save_modules(db, course_id, course.version, modules, reservation_id)
+    await db.execute(
+        update(models.CourseLesson)
+        .where(
+            models.CourseLesson.module_id == select(models.CourseModule.id).where(
+                models.CourseModule.course_id == course_id,
+                models.CourseModule.position == module_index
+            ).scalar_subquery(),
+            models.CourseLesson.position == lesson_index
+        )
+        .values(content=lesson["content"])
+    )
+    await db.commit()
+
+    return {
+        "course_id": course_id,
+        "module_index": module_index,
+        "lesson_index": lesson_index,
+        "module_title": module["module_title"],
+        "lesson_title": lesson["lesson_title"],
+        "content": lesson["content"],
+        "version": version,
+    }
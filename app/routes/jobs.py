@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, models, utils
+from ..database import get_db
+
+router = APIRouter(tags=['Jobs'])
+
+@router.get('/jobs/{job_id}', response_model=schemas.JobResponse)
+async def get_job(
+    job_id: str,
+    current_user: models.User = Depends(utils.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Consulta o status de um job de geração (queued, running, done ou failed)
+    """
+    result = await db.execute(select(models.GenerationJob).where(
+        models.GenerationJob.id == job_id,
+        models.GenerationJob.user_id == current_user.id
+    ))
+    job = result.scalars().first()
+
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Job não encontrado ou você não tem permissão para acessá-lo"
+        )
+
+    return job
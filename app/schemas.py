@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator, model_validator
 from typing import Optional, List
 from datetime import datetime
+from .blobs import wallpaper_blob, wallpaper_url
 
 class UserBase(BaseModel):
     email: EmailStr
@@ -12,11 +13,17 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     is_active: bool
-    credits: int
+    credits: float
 
     class Config:
         from_attributes = True
 
+    @field_validator("credits")
+    @classmethod
+    def _round_credits(cls, value: float) -> float:
+        # Bancos sem NUMERIC exato (SQLite) acumulam resíduos de ponto flutuante
+        return round(value, 2)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -39,6 +46,8 @@ class CourseRequest(BaseModel):
     depth_level: Optional[str] = "Intermediário"
     voice_tone: Optional[str] = "Formal"
     generate_cover_image: Optional[bool] = True
+    fresh: Optional[bool] = False  # Ignora o cache e gera uma nova variação
+    provider: Optional[str] = None  # openai, gemini ou fake; None usa LLM_PROVIDER
 
 class CourseContentFinalSummary(BaseModel):
     title: str
@@ -66,6 +75,21 @@ class CourseContentModule(BaseModel):
     lessons: List[CourseContentLesson]
     practice_activities: List[CourseContentPracticeActivity]
 
+class CourseContentQuizSection(BaseModel):
+    final_summary: CourseContentFinalSummary
+    assessment_quiz: List[CourseContentQuizQuestion]
+
+class CourseContentOutlineModule(BaseModel):
+    module_title: str
+    chapter: str
+    lesson_titles: List[str]
+
+class CourseContentOutline(BaseModel):
+    title: str
+    subtitle: str
+    wallpaper: str = ""
+    modules: List[CourseContentOutlineModule]
+
 class CourseContent(BaseModel):
     title: str
     subtitle: str
@@ -86,13 +110,76 @@ class CourseResponse(BaseModel):
     depth_level: str
     voice_tone: str
     user_id: int
+    version: int
 
     class Config:
         from_attributes = True
 
+    @model_validator(mode="after")
+    def _wallpaper_blob_url(self):
+        # Capa guardada no blob store: a resposta leva a URL, não a imagem
+        name = wallpaper_blob(self.wallpaper)
+        if name is not None:
+            self.wallpaper = wallpaper_url(self.id, name)
+        return self
+
+class CourseOutlineLesson(BaseModel):
+    index: int
+    lesson_title: str
+
+class CourseOutlineModule(BaseModel):
+    index: int
+    module_title: str
+    chapter: str
+    lessons: List[CourseOutlineLesson]
+
+class CourseOutline(BaseModel):
+    id: int
+    title: str
+    subtitle: str
+    language: str
+    depth_level: str
+    voice_tone: str
+    version: int
+    modules: List[CourseOutlineModule]
+    quiz_questions: int
+
+class CourseLessonResponse(BaseModel):
+    course_id: int
+    module_index: int
+    lesson_index: int
+    module_title: str
+    lesson_title: str
+    content: str
+
+class RegenerateRequest(BaseModel):
+    version: Optional[int] = None  # Versão do curso que o cliente viu; diferente da atual: 409
+    provider: Optional[str] = None
+
+class CourseModuleRegenerateResponse(BaseModel):
+    course_id: int
+    module_index: int
+    version: int
+    module: CourseContentModule
+
+class CourseLessonRegenerateResponse(CourseLessonResponse):
+    version: int
+
 class CourseList(BaseModel):
     id: int
     title: str
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    course_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
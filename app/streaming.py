@@ -0,0 +1,197 @@
+import json
+from .json_repair import repair_json
+
+WHITESPACE = " \t\r\n"
+
+# Caminhos do JSON do curso que viram eventos assim que fecham
+COURSE_STREAM_PATHS = [
+    ("title",),
+    ("subtitle",),
+    ("wallpaper",),
+    ("modules", "*", "lessons", "*"),
+    ("modules", "*"),
+    ("final_summary",),
+    ("assessment_quiz", "*"),
+]
+
+
+# Valor capturado que não pôde ser lido nem reparado
+INVALID = object()
+
+
+def _load(text: str):
+    """
+    Lê um valor capturado; vírgulas sobrando e afins passam pelo repair_json.
+    Devolve INVALID se nada se aproveitar, para a seção ser gerada de novo
+    """
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        value, truncated = repair_json(text)
+    except ValueError:
+        return INVALID
+    return INVALID if truncated else value
+
+
+def _matches(path: tuple, pattern: tuple) -> bool:
+    if len(path) != len(pattern):
+        return False
+    return all(part == "*" or part == key for key, part in zip(path, pattern))
+
+
+class IncrementalJSONParser:
+    """
+    Parser incremental de JSON que recebe o texto em pedaços e devolve
+    cada valor cujo caminho casa com um dos padrões assim que ele fecha.
+    Um valor malformado vem como INVALID em vez de interromper o stream.
+
+    Só o trecho do valor capturado mais externo ainda aberto fica em memória;
+    qualquer texto antes do primeiro '{' (ex.: cerca ```json) é ignorado.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = [tuple(pattern) for pattern in patterns]
+        self.done = False
+        self._text = ""
+        self._offset = 0  # Posição absoluta de self._text[0]
+        self._stack = []  # Frames: {"kind", "key", "index", "state"}
+        self._captures = {}  # profundidade -> (caminho, início absoluto)
+        self._started = False
+        self._in_string = False
+        self._string_is_key = False
+        self._string_start = 0
+        self._escape = False
+        self._in_scalar = False
+
+    def feed(self, chunk: str) -> list:
+        """
+        Processa mais um pedaço do texto e retorna a lista de (caminho, valor)
+        dos valores completados
+        """
+        events = []
+        start = self._offset + len(self._text)
+        self._text += chunk
+
+        for i, char in enumerate(chunk):
+            if self.done:
+                break
+            self._process(char, start + i, events)
+
+        self._trim()
+        return events
+
+    def _current_path(self) -> tuple:
+        path = []
+        for frame in self._stack:
+            path.append(frame["key"] if frame["kind"] == "object" else frame["index"])
+        return tuple(path)
+
+    def _slice(self, start: int, end: int) -> str:
+        return self._text[start - self._offset:end - self._offset]
+
+    def _trim(self):
+        starts = [start for _, start in self._captures.values()]
+        if self._in_string and self._string_is_key:
+            starts.append(self._string_start)
+        keep_from = min(starts) if starts else self._offset + len(self._text)
+        self._text = self._text[keep_from - self._offset:]
+        self._offset = keep_from
+
+    def _value_start(self, char: str, pos: int):
+        path = self._current_path()
+        if any(_matches(path, pattern) for pattern in self.patterns):
+            self._captures[len(self._stack)] = (path, pos)
+
+        if self._stack:
+            self._stack[-1]["state"] = "comma"
+
+        if char == "{":
+            self._stack.append({"kind": "object", "key": None, "index": None, "state": "key"})
+        elif char == "[":
+            self._stack.append({"kind": "array", "key": None, "index": -1, "state": "value"})
+        elif char == '"':
+            self._in_string = True
+            self._string_is_key = False
+            self._escape = False
+        else:
+            self._in_scalar = True
+
+    def _value_end(self, end: int, events: list):
+        capture = self._captures.pop(len(self._stack), None)
+        if capture is not None:
+            path, start = capture
+            events.append((path, _load(self._slice(start, end))))
+        if not self._stack:
+            self.done = True
+
+    def _process(self, char: str, pos: int, events: list):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._stack[-1]["key"] = json.loads(self._slice(self._string_start, pos + 1), strict=False)
+                    self._stack[-1]["state"] = "colon"
+                else:
+                    self._value_end(pos + 1, events)
+            return
+
+        if self._in_scalar:
+            if char not in WHITESPACE and char not in ",}]":
+                return
+            self._in_scalar = False
+            self._value_end(pos, events)
+
+        if char in WHITESPACE:
+            return
+
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._value_start(char, pos)
+            return
+
+        if not self._stack:
+            return
+
+        frame = self._stack[-1]
+        state = frame["state"]
+
+        if state == "key":
+            if char == '"':
+                self._in_string = True
+                self._string_is_key = True
+                self._string_start = pos
+                self._escape = False
+            elif char == "}":
+                self._stack.pop()
+                self._value_end(pos + 1, events)
+        elif state == "colon":
+            if char == ":":
+                frame["state"] = "value"
+        elif state == "comma":
+            if char == ",":
+                frame["state"] = "key" if frame["kind"] == "object" else "value"
+            elif char in "}]":
+                self._stack.pop()
+                self._value_end(pos + 1, events)
+        elif state == "value":
+            if frame["kind"] == "array":
+                if char == "]":
+                    self._stack.pop()
+                    self._value_end(pos + 1, events)
+                    return
+                frame["index"] += 1
+            self._value_start(char, pos)
+
+
+def format_sse(event: str, data) -> str:
+    """
+    Formata um evento Server-Sent Events com payload JSON
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
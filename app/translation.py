@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from dotenv import load_dotenv
+from .generation import gather_or_cancel
+from .json_repair import repair_json
+from .llm import LLMClient
+from .hedging import hedger
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", 8))  # Chamadas simultâneas por curso
+TRANSLATION_RETRIES = int(os.getenv("TRANSLATION_RETRIES", 2))  # Novas tentativas por trecho
+TRANSLATION_QUIZ_CHUNK = int(os.getenv("TRANSLATION_QUIZ_CHUNK", 5))  # Questões por chamada
+
+SOURCE_MARKER = "JSON de origem:\n"
+
+TAG_PATTERN = re.compile(r"<\s*(/?)\s*([a-zA-Z][a-zA-Z0-9]*)")
+
+
+def build_translation_prompt(language: str, source: dict) -> str:
+    """
+    Monta o prompt de tradução de um trecho do curso (JSON com textos em HTML)
+    """
+    return f"""
+Você é um tradutor técnico especializado em material didático.
+
+Traduza o JSON abaixo para **{language}**:
+
+- Traduza apenas os valores de texto; mantenha as chaves, a ordem dos itens, os números e os booleanos.
+- Preserve a estrutura HTML: as mesmas tags, na mesma ordem e com os mesmos atributos; traduza só o texto entre elas.
+- Não traduza código dentro de `<code>` e `<pre>`.
+- Mantenha o tom e o nível técnico do original.
+
+A resposta deve ser **exclusivamente o JSON traduzido**, sem texto extra.
+
+{SOURCE_MARKER}{json.dumps(source, ensure_ascii=False)}
+"""
+
+
+def _tags(html: str) -> list:
+    return [(closing, name.lower()) for closing, name in TAG_PATTERN.findall(html)]
+
+
+def check_translation(source, translated, path: str = "$"):
+    """
+    ValueError se a tradução não tiver a forma do original: mesmas chaves,
+    mesmo número de itens, mesmos valores não textuais (ex.: is_correct) e
+    a mesma sequência de tags HTML em cada texto
+    """
+    if isinstance(source, dict):
+        if not isinstance(translated, dict) or set(translated) != set(source):
+            raise ValueError(f"{path}: chaves diferentes do original")
+        for key, value in source.items():
+            check_translation(value, translated[key], f"{path}.{key}")
+    elif isinstance(source, list):
+        if not isinstance(translated, list) or len(translated) != len(source):
+            raise ValueError(f"{path}: número de itens diferente do original")
+        for index, (value, item) in enumerate(zip(source, translated)):
+            check_translation(value, item, f"{path}[{index}]")
+    elif isinstance(source, str):
+        if not isinstance(translated, str):
+            raise ValueError(f"{path}: texto esperado")
+        if _tags(source) != _tags(translated):
+            raise ValueError(f"{path}: estrutura HTML alterada")
+    elif source != translated:
+        raise ValueError(f"{path}: valor alterado")
+
+
+def _parser(source: dict):
+    def parse(response_text: str) -> dict:
+        data, truncated = repair_json(response_text)
+        if truncated:
+            raise ValueError("resposta da IA incompleta")
+        check_translation(source, data)
+        return data
+    return parse
+
+
+async def _translate(client: LLMClient, name: str, language: str, source: dict, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Traduz um trecho, repetindo só ele em caso de resposta inválida
+    """
+    prompt = build_translation_prompt(language, source)
+    for attempt in range(TRANSLATION_RETRIES + 1):
+        try:
+            async with semaphore:
+                return await hedger.run("translate", client, prompt, _parser(source))
+        except (json.JSONDecodeError, ValueError) as e:
+            if attempt == TRANSLATION_RETRIES:
+                raise
+            logger.warning("Tradução de %s inválida (tentativa %d): %s", name, attempt + 1, e)
+
+
+async def translate_course(client: LLMClient, course_data: dict, language: str) -> dict:
+    """
+    Traduz o conteúdo de um curso em trechos independentes e paralelos
+    (cabeçalho com títulos dos módulos, cada aula, atividades de cada módulo,
+    resumo e blocos do questionário). A capa é reaproveitada
+    """
+    semaphore = asyncio.Semaphore(TRANSLATION_CONCURRENCY)
+    modules = course_data["modules"]
+    quiz = course_data["assessment_quiz"]
+
+    header = {
+        "title": course_data["title"],
+        "subtitle": course_data["subtitle"],
+        "modules": [{"module_title": module["module_title"], "chapter": module["chapter"]} for module in modules],
+    }
+    tasks = [_translate(client, "cabeçalho", language, header, semaphore)]
+    for module_index, module in enumerate(modules):
+        for lesson_index, lesson in enumerate(module["lessons"]):
+            tasks.append(_translate(client, f"aula {module_index + 1}.{lesson_index + 1}", language, lesson, semaphore))
+        tasks.append(_translate(
+            client, f"atividades do módulo {module_index + 1}", language,
+            {"practice_activities": module["practice_activities"]}, semaphore
+        ))
+    tasks.append(_translate(client, "resumo final", language, {"final_summary": course_data["final_summary"]}, semaphore))
+    for start in range(0, len(quiz), TRANSLATION_QUIZ_CHUNK):
+        tasks.append(_translate(
+            client, f"questões {start + 1}+", language,
+            {"assessment_quiz": quiz[start:start + TRANSLATION_QUIZ_CHUNK]}, semaphore
+        ))
+
+    # Remonta na mesma ordem em que os trechos foram criados; uma falha cancela o resto
+    results = iter(await gather_or_cancel(*tasks))
+    header = next(results)
+    translated_modules = []
+    for module, module_header in zip(modules, header["modules"]):
+        lessons = [next(results) for _ in module["lessons"]]
+        translated_modules.append({
+            **module_header,
+            "lessons": lessons,
+            "practice_activities": next(results)["practice_activities"],
+        })
+    final_summary = next(results)["final_summary"]
+    assessment_quiz = [question for chunk in results for question in chunk["assessment_quiz"]]
+
+    return {
+        "title": header["title"],
+        "subtitle": header["subtitle"],
+        "wallpaper": course_data["wallpaper"],
+        "modules": translated_modules,
+        "final_summary": final_summary,
+        "assessment_quiz": assessment_quiz,
+    }
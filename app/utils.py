@@ -2,10 +2,14 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import schemas, models
+from .cache import TTLCache
 from .database import get_db
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +18,18 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# Cache de autenticação: tokens já verificados (até o exp) e usuários por subject
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 30))  # Outros processos veem mudanças após esse tempo
+
+token_cache = TTLCache(max_size=AUTH_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+user_cache = TTLCache(max_size=AUTH_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+_user_subjects = TTLCache(max_size=AUTH_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)  # user_id -> subject, para invalidação
+
+# Colunas guardadas no cache (sem o hash da senha)
+USER_CACHE_COLUMNS = ("id", "full_name", "email", "is_active", "credits")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 def create_access_token(data: dict):
@@ -24,6 +40,11 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_token(token: str, credentials_exception):
+    if AUTH_CACHE_ENABLED:
+        email = token_cache.get(token)
+        if email is not None:
+            return schemas.TokenData(email=email)
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -32,16 +53,72 @@ def verify_token(token: str, credentials_exception):
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
+
+    if AUTH_CACHE_ENABLED and payload.get("exp"):
+        # Válido no cache só até expirar
+        token_cache.set(token, email, ttl=payload["exp"] - time.time())
     return token_data
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def token_subject(token: str):
+    """
+    Subject (email) de um token válido, ou None. Usa o mesmo cache de
+    verify_token, então custa uma consulta ao dict na maioria das requisições
+    """
+    try:
+        return verify_token(token, JWTError()).email
+    except JWTError:
+        return None
+
+def cache_user(user: models.User):
+    if not AUTH_CACHE_ENABLED:
+        return
+    user_cache.set(user.email, {column: getattr(user, column) for column in USER_CACHE_COLUMNS})
+    _user_subjects.set(user.id, user.email)
+
+def invalidate_user(user_id: int):
+    """
+    Remove o usuário do cache deste processo (ex.: mudou email, senha ou créditos)
+    """
+    subject = _user_subjects.pop(user_id)
+    if subject is not None:
+        user_cache.pop(subject)
+
+def invalidate_user_on_commit(db, user_id: int):
+    """
+    Invalida o usuário quando a transação de `db` for confirmada. Invalidar
+    antes do commit deixaria uma requisição concorrente pôr o saldo antigo
+    de volta no cache
+    """
+    db.info.setdefault("invalidate_users", set()).add(user_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("invalidate_users", ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    # Nada mudou no banco: o cache continua certo
+    session.info.pop("invalidate_users", None)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+
+    if AUTH_CACHE_ENABLED:
+        cached = user_cache.get(token_data.email)
+        if cached is not None:
+            # Instância nova e fora da sessão; rotas que alteram o usuário
+            # devem carregá-lo com db.get
+            return models.User(**cached)
+
+    result = await db.execute(select(models.User).where(models.User.email == token_data.email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    cache_user(user)
     return user
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+Benchmark de GET /courses/{id}.
+
+Compara o caminho anterior (carrega o curso, valida o CourseResponse e
+serializa a cada requisição) com a resposta pré-serializada (sem compressão
+e pré-comprimida em gzip) e o 304 com If-None-Match. Mede latência (p50/p99) e CPU do processo por requisição.
+
+Uso (SQLite local):
+    DATABASE_URL=sqlite:///./bench.db SECRET_KEY=bench ALGORITHM=HS256 \\
+    ACCESS_TOKEN_EXPIRE_MINUTES=60 python -m benchmarks.bench_course_payload
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas, utils
+from app.database import Base, engine, SessionLocal, get_db
+from app.routes import courses
+
+EMAIL = "bench-payload@lessonhub.dev"
+LESSON_HTML = "<h2>Seção</h2><p>" + "Conteúdo da aula com exemplos e explicações detalhadas. " * 45 + "</p>"
+
+
+def build_app() -> FastAPI:
+    bench_app = FastAPI()
+    bench_app.include_router(courses.router)
+
+    @bench_app.get('/legacy/courses/{course_id}', response_model=schemas.CourseResponse)
+    async def get_course_legacy(
+        course_id: int,
+        current_user: models.User = Depends(utils.get_current_user),
+        db: AsyncSession = Depends(get_db)
+    ):
+        # Cópia do endpoint anterior, só para comparação
+        result = await db.execute(select(models.Course).where(
+            models.Course.id == course_id,
+            models.Course.user_id == current_user.id
+        ))
+        course = result.scalars().first()
+        if not course:
+            raise HTTPException(status_code=404, detail="Curso não encontrado")
+        return course
+
+    return bench_app
+
+
+def create_course() -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(models.User).where(models.User.email == EMAIL))
+        user = models.User(full_name="Bench", email=EMAIL, hashed_password="-", credits=0)
+        db.add(user)
+        db.flush()
+        course = models.Course(
+            title="Bench", subtitle="Bench", wallpaper="",
+            modules=[
+                {
+                    "module_title": f"Módulo {m}", "chapter": f"Capítulo {m}",
+                    "lessons": [{"lesson_title": f"Aula {m}.{i}", "content": LESSON_HTML} for i in range(7)],
+                    "practice_activities": [{"title": "Atividade", "content": "<p>Pratique o conteúdo.</p>"}]
+                }
+                for m in range(3)
+            ],
+            final_summary={"title": "Resumo", "content": "<p>Resumo do curso.</p>"},
+            assessment_quiz=[
+                {"text": f"Questão {i}?", "alternatives": [{"text": f"Alternativa {a}", "is_correct": a == 0} for a in range(4)]}
+                for i in range(10)
+            ],
+            language="Português", depth_level="Intermediário", voice_tone="Didático",
+            user_id=user.id
+        )
+        db.add(course)
+        db.commit()
+        return course.id
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int, headers: dict = None) -> dict:
+    response = await client.get(path, headers=headers)
+    assert response.status_code in (200, 304), response.text
+
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(requests):
+        start = time.perf_counter()
+        await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+
+    return {
+        "bytes": response.num_bytes_downloaded,  # Bytes no fio (comprimidos, se for o caso)
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_ms": cpu / requests * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    course_id = create_course()
+    headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': EMAIL})}"}
+    transport = httpx.ASGITransport(app=build_app(), client=("127.0.0.1", 5000))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        etag = (await client.get(f"/courses/{course_id}", headers={"Accept-Encoding": "gzip"})).headers["ETag"]
+        scenarios = (
+            ("anterior (pydantic)", f"/legacy/courses/{course_id}", {"Accept-Encoding": "identity"}),
+            ("pré-serializado", f"/courses/{course_id}", {"Accept-Encoding": "identity"}),
+            ("pré-comprimido gzip", f"/courses/{course_id}", {"Accept-Encoding": "gzip"}),
+            ("304 If-None-Match", f"/courses/{course_id}", {"Accept-Encoding": "gzip", "If-None-Match": etag}),
+        )
+
+        print(f"{'caminho':<22}{'bytes':>9}{'p50 (ms)':>10}{'p99 (ms)':>10}{'CPU/req (ms)':>14}")
+        for label, path, extra_headers in scenarios:
+            result = await measure(client, path, args.requests, extra_headers)
+            print(
+                f"{label:<22}{result['bytes']:>9}{result['p50_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['cpu_ms']:>14.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
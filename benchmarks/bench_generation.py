@@ -0,0 +1,97 @@
+"""
+Benchmark do caminho completo de geração com o provedor falso.
+
+Enfileira N cursos (POST /generate-course com fresh=true), roda o pool de
+jobs e mede cursos por minuto e a latência de ponta a ponta (do POST ao job
+`done`), sem chamar APIs reais. Latência, jitter, cauda lenta e falhas do
+provedor vêm de FAKE_LLM_*; com LLM_HEDGE_PROVIDER (ex.: fake:0.5) mede
+também o efeito do hedging.
+
+Uso (SQLite local):
+    DATABASE_URL=sqlite:///./bench.db SECRET_KEY=bench ALGORITHM=HS256 \\
+    ACCESS_TOKEN_EXPIRE_MINUTES=60 python -m benchmarks.bench_generation --courses 50 --workers 8
+"""
+import os
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "0.5")
+os.environ.setdefault("FAKE_LLM_JITTER", "0.2")
+os.environ.setdefault("JOB_POLL_INTERVAL", "0.05")
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import delete
+from app import models, utils, generation
+from app.database import Base, engine, SessionLocal
+from app.jobs import job_pool
+from app.llm import llm_stats
+from app.hedging import hedger
+from app.routes import courses, jobs
+
+EMAIL = "bench-generation@lessonhub.dev"
+
+
+def create_user(credits: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(models.User).where(models.User.email == EMAIL))
+        db.add(models.User(full_name="Bench", email=EMAIL, hashed_password="-", credits=credits))
+        db.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run_course(client: httpx.AsyncClient, index: int) -> tuple:
+    start = time.perf_counter()
+    response = await client.post("/generate-course", json={"topic": f"Tema {index}", "fresh": True})
+    job = response.json()
+    while job["status"] in ("queued", "running"):
+        await asyncio.sleep(0.05)
+        job = (await client.get(f"/jobs/{job['id']}")).json()
+    return job["status"], time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=8, help="Gerações simultâneas no pool de jobs")
+    args = parser.parse_args()
+
+    create_user(args.courses)
+    bench_app = FastAPI()
+    bench_app.include_router(courses.router)
+    bench_app.include_router(jobs.router)
+
+    job_pool.concurrency = args.workers
+    await job_pool.start()
+    headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': EMAIL})}"}
+    transport = httpx.ASGITransport(app=bench_app, client=("127.0.0.1", 5000))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(run_course(client, index) for index in range(args.courses)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await job_pool.stop()
+
+    latencies = [latency for status, latency in results if status == "done"]
+    failed = sum(1 for status, _ in results if status != "done")
+    print(f"provedor: {os.environ['LLM_PROVIDER']}  modo: {generation.GENERATION_MODE}  workers: {args.workers}")
+    print(f"cursos: {len(latencies)} ok, {failed} falharam em {elapsed:.1f}s ({len(latencies) / elapsed * 60:.1f} cursos/min)")
+    if latencies:
+        print(f"latência p50: {statistics.median(latencies):.2f}s  p99: {percentile(latencies, 0.99):.2f}s")
+    print(f"chamadas à IA: {llm_stats()}")
+    if hedger.secondary:
+        stats = hedger.stats()
+        print(f"hedging: {stats['hedged']} reservas ({stats['hedge_won']} venceram, {stats['skipped_by_rate']} barradas pelo limite)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
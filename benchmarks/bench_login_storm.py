@@ -0,0 +1,113 @@
+"""
+Benchmark de tempestade de logins.
+
+Mede a vazão de POST /login e a latência (p50/p99) de um endpoint não
+relacionado (GET /health) enquanto muitos logins concorrentes acontecem,
+com o bcrypt em threads (PASSWORD_HASH_WORKERS=0, comportamento anterior)
+e no pool de processos dedicado.
+
+Uso (SQLite local):
+    DATABASE_URL=sqlite:///./bench.db SECRET_KEY=bench ALGORITHM=HS256 \\
+    ACCESS_TOKEN_EXPIRE_MINUTES=60 python -m benchmarks.bench_login_storm
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import delete
+from app import models
+from app.database import Base, engine, SessionLocal
+from app.hashing import password_hasher, pwd_context
+from app.routes import auth
+
+EMAIL = "bench@lessonhub.dev"
+PASSWORD = "bench-password"
+
+
+def build_app() -> FastAPI:
+    # Só as rotas envolvidas, sem middlewares (o rate limit atrapalharia a medição)
+    bench_app = FastAPI()
+    bench_app.include_router(auth.router)
+
+    @bench_app.get("/health")
+    def health_check():
+        return {"status": "healthy", "timestamp": time.time()}
+
+    return bench_app
+
+
+def create_user():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(models.User).where(models.User.email == EMAIL))
+        db.add(models.User(full_name="Bench", email=EMAIL, hashed_password=pwd_context.hash(PASSWORD), credits=0))
+        db.commit()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(workers: int, logins: int, concurrency: int) -> dict:
+    password_hasher.shutdown()
+    password_hasher.workers = workers
+    password_hasher.max_pending = logins
+
+    transport = httpx.ASGITransport(app=build_app(), client=("127.0.0.1", 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Aquece o pool de processos
+        await client.post("/login", json={"email": EMAIL, "password": PASSWORD})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/login", json={"email": EMAIL, "password": PASSWORD})
+                assert response.status_code == 200, response.text
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await prober
+
+    password_hasher.shutdown()
+    return {
+        "logins_per_second": logins / elapsed,
+        "health_p50_ms": statistics.median(latencies) * 1000,
+        "health_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2, help="processos bcrypt do modo pool")
+    args = parser.parse_args()
+
+    create_user()
+    print(f"{'modo':<22}{'logins/s':>10}{'health p50 (ms)':>18}{'health p99 (ms)':>18}")
+    for label, workers in (("threads (anterior)", 0), (f"processos ({args.workers})", args.workers)):
+        result = await run(workers, args.logins, args.concurrency)
+        print(
+            f"{label:<22}{result['logins_per_second']:>10.1f}"
+            f"{result['health_p50_ms']:>18.2f}{result['health_p99_ms']:>18.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
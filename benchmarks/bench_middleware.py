@@ -0,0 +1,172 @@
+"""
+Benchmark da pilha de middlewares.
+
+Mede requisições por segundo em GET /health e GET /courses/{id} com os
+middlewares no estilo @app.middleware("http") (call_next, versão anterior)
+e com os middlewares ASGI puros.
+
+Uso (SQLite local):
+    DATABASE_URL=sqlite:///./bench.db SECRET_KEY=bench ALGORITHM=HS256 \\
+    ACCESS_TOKEN_EXPIRE_MINUTES=60 python -m benchmarks.bench_middleware
+"""
+import os
+
+# Orçamentos altos e estado em memória: o benchmark mede o custo dos middlewares, não os 429
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_MAX_REQUESTS", "1000000000")
+
+import argparse
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import delete
+from app import models, utils
+from app.database import Base, engine, SessionLocal
+from app.middleware import (
+    BUDGETS, RateLimitMiddleware, ProcessTimeMiddleware, concurrency_limiter,
+    match_policy, rate_limiters, request_identity, _too_many_requests
+)
+from app.routes import courses
+
+EMAIL = "bench-middleware@lessonhub.dev"
+
+
+async def legacy_rate_limit_middleware(request: Request, call_next):
+    # Cópia da versão anterior (call_next), só para comparação
+    policy = match_policy(request.method, request.url.path)
+    if policy.budget is None:
+        return await call_next(request)
+
+    budget = BUDGETS[policy.budget]
+    key = f"{policy.budget}:{request_identity(request.scope, budget)}"
+    limit = budget.limit // policy.cost
+
+    result = rate_limiters[policy.budget].check(key, policy.cost)
+    if not result.allowed:
+        return _too_many_requests(result.retry_after, limit)
+
+    lease = None
+    if budget.max_concurrent:
+        lease = await concurrency_limiter.acquire(f"concurrent:{key}", budget.max_concurrent)
+        if lease is None:
+            return _too_many_requests(10, limit)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        if lease is not None:
+            await concurrency_limiter.release(lease)
+        raise
+
+    if lease is not None:
+        body_iterator = response.body_iterator
+
+        async def release_when_done():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                await concurrency_limiter.release(lease)
+
+        response.body_iterator = release_when_done()
+
+    response.headers["X-RateLimit-Limit"] = str(limit)
+    response.headers["X-RateLimit-Remaining"] = str(result.remaining // policy.cost)
+    return response
+
+
+async def legacy_process_time(request: Request, call_next):
+    start_time = time.time()
+    response = await call_next(request)
+    response.headers["X-Process-Time"] = str(time.time() - start_time)
+    return response
+
+
+def build_app(asgi: bool) -> FastAPI:
+    bench_app = FastAPI()
+    if asgi:
+        bench_app.add_middleware(RateLimitMiddleware)
+    else:
+        bench_app.middleware("http")(legacy_rate_limit_middleware)
+    bench_app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+    if asgi:
+        bench_app.add_middleware(ProcessTimeMiddleware)
+    else:
+        bench_app.middleware("http")(legacy_process_time)
+    bench_app.include_router(courses.router)
+
+    @bench_app.get("/health")
+    def health_check():
+        return {"status": "healthy", "timestamp": time.time()}
+
+    return bench_app
+
+
+def create_course() -> int:
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(models.User).where(models.User.email == EMAIL))
+        user = models.User(full_name="Bench", email=EMAIL, hashed_password="-", credits=0)
+        db.add(user)
+        db.flush()
+        lessons = [{"lesson_title": f"Aula {i}", "content": "<p>conteúdo</p>" * 50} for i in range(6)]
+        course = models.Course(
+            title="Bench", subtitle="Bench", wallpaper="",
+            modules=[
+                {
+                    "module_title": f"Módulo {m}", "chapter": f"Capítulo {m}", "lessons": lessons,
+                    "practice_activities": [{"title": "Atividade", "content": "<p>atividade</p>"}]
+                }
+                for m in range(3)
+            ],
+            final_summary={"title": "Resumo", "content": "<p>resumo</p>"},
+            assessment_quiz=[
+                {"text": f"Questão {i}?", "alternatives": [{"text": "a", "is_correct": True}, {"text": "b", "is_correct": False}]}
+                for i in range(10)
+            ],
+            language="Português", depth_level="Intermediate", voice_tone="Didático",
+            user_id=user.id
+        )
+        db.add(course)
+        db.commit()
+        return course.id
+
+
+async def measure(app: FastAPI, path: str, headers: dict, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        response = await client.get(path)
+        assert response.status_code == 200, response.text
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await client.get(path)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    course_id = create_course()
+    headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': EMAIL})}"}
+
+    print(f"{'middlewares':<16}{'/health req/s':>16}{'/courses/{id} req/s':>22}")
+    for label, asgi in (("call_next", False), ("ASGI puro", True)):
+        bench_app = build_app(asgi)
+        health = await measure(bench_app, "/health", {}, args.requests, args.concurrency)
+        course = await measure(bench_app, f"/courses/{course_id}", headers, args.requests, args.concurrency)
+        print(f"{label:<16}{health:>16.0f}{course:>22.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark do rate limiter.
+
+Compara o limiter anterior (lista de timestamps por cliente, um lock global)
+com o GCRA em cada store (memory, shm, sqlite): vazão de verificações, memória retida com muitos
+clientes distintos e memória depois da remoção de clientes ociosos.
+
+Uso:
+    python -m benchmarks.bench_rate_limiter --clients 100000
+"""
+import argparse
+import gc
+import random
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from app.middleware import RateLimiter
+from app.ratelimit import create_store
+
+
+class LegacyRateLimiter:
+    # Cópia da implementação anterior, só para comparação
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def is_allowed(self, client_id: str) -> bool:
+        now = time.time()
+
+        with self.lock:
+            self.requests[client_id] = [
+                req_time for req_time in self.requests[client_id]
+                if now - req_time < self.window_seconds
+            ]
+            if len(self.requests[client_id]) >= self.max_requests:
+                return False
+            self.requests[client_id].append(now)
+            return True
+
+
+def throughput(limiter, clients: list, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        limiter.is_allowed(random.choice(clients))
+    return requests / (time.perf_counter() - start)
+
+
+def retained_memory(limiter, clients: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    for client_id in clients:
+        limiter.is_allowed(client_id)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return memory / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=500000, help="verificações por cenário")
+    parser.add_argument("--backends", default="memory,shm", help="stores comparados (memory, shm, sqlite)")
+    parser.add_argument("--window", type=float, default=5.0, help="janela curta para medir a remoção de ociosos")
+    args = parser.parse_args()
+
+    random.seed(0)
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.clients)]
+
+    hot = clients[:100]  # Poucos clientes no limite: a lista do anterior chega a max_requests itens
+    print(f"{'limiter':<16}{'memória (MB)':>14}{'distintos/s':>14}{'no limite/s':>14}")
+    results = {}
+    limiters = [("anterior", LegacyRateLimiter(max_requests=100, window_seconds=args.window))]
+    for backend in args.backends.split(","):
+        store = create_store(backend, max_keys=args.clients * 2, path=f"/tmp/bench-ratelimit-{backend}-{args.clients * 2}")
+        limiters.append((f"gcra ({backend})", RateLimiter(max_requests=100, window_seconds=args.window, store=store)))
+
+    for label, limiter in limiters:
+        memory = retained_memory(limiter, clients)
+        distinct = throughput(limiter, clients, args.requests)
+        at_limit = throughput(limiter, hot, args.requests)
+        results[label] = limiter
+        print(f"{label:<16}{memory:>14.1f}{distinct:>14.0f}{at_limit:>14.0f}")
+
+    # Depois da janela todos os clientes estão ociosos: o anterior mantém as chaves
+    time.sleep(args.window)
+    print(f"\nchaves retidas pelo anterior: {len(results['anterior'].requests)}")
+    for label, limiter in results.items():
+        if label == "anterior":
+            continue
+        start = time.perf_counter()
+        removed = limiter.evict_idle()
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {removed} clientes ociosos removidos em {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Verificação das novas tentativas e do circuit breaker contra um servidor
+HTTP falso compatível com a API da OpenAI (sem chamar APIs reais).
+
+Sobe o servidor numa thread, aponta o provedor openai para ele
+(OPENAI_BASE_URL) e confere:
+  - 5xx e 429 são repetidos (429 respeitando o Retry-After);
+  - 4xx não é repetido nem conta para o breaker;
+  - falhas seguidas abrem o breaker, que passa a recusar sem chamar o provedor;
+  - com o breaker aberto, POST /generate-course e /generate-course/stream
+    respondem 503 com Retry-After sem debitar crédito;
+  - depois de LLM_BREAKER_RESET_SECONDS, uma chamada de teste fecha o breaker.
+
+Uso (SQLite local):
+    DATABASE_URL=sqlite:///./bench.db SECRET_KEY=bench ALGORITHM=HS256 \\
+    ACCESS_TOKEN_EXPIRE_MINUTES=60 python -m benchmarks.check_llm_resilience
+"""
+import os
+import sys
+
+PORT = int(os.getenv("MOCK_LLM_PORT", 18080))
+
+os.environ["LLM_PROVIDER"] = "openai"
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "mock")
+os.environ["LLM_MAX_RETRIES"] = "3"
+os.environ["LLM_RETRY_BASE_DELAY"] = "0.01"
+os.environ["LLM_BREAKER_FAILURE_THRESHOLD"] = "3"
+os.environ["LLM_BREAKER_RESET_SECONDS"] = "1"
+
+import asyncio
+import json
+import threading
+import time
+import httpx
+import openai
+import uvicorn
+from fastapi import FastAPI
+from sqlalchemy import delete, select
+from app import models, utils
+from app.database import Base, engine, SessionLocal
+from app.llm import LLMUnavailableError, get_llm_client, close_llm_clients, CLOSED, OPEN
+from app.routes import courses
+
+EMAIL = "check-llm-resilience@lessonhub.dev"
+CREDITS = 5
+
+
+class MockLLMServer:
+    """
+    Servidor falso de chat completions. Cada pedido consome a próxima
+    resposta de `failures` (status, Retry-After); com a lista vazia, responde 200
+    """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.failures = []
+        self.requests = 0
+        self._server = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        while (await receive()).get("more_body"):
+            pass
+        self.requests += 1
+
+        if self.failures:
+            status, retry_after = self.failures.pop(0)
+            headers = [(b"content-type", b"application/json")]
+            if retry_after is not None:
+                headers.append((b"retry-after", str(retry_after).encode()))
+            body = {"error": {"message": f"falha simulada {status}", "type": "mock"}}
+        else:
+            status = 200
+            headers = [(b"content-type", b"application/json")]
+            body = {
+                "id": "mock", "object": "chat.completion", "created": 0, "model": "mock",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+            }
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+    def start(self):
+        self._server = uvicorn.Server(uvicorn.Config(self, port=self.port, log_level="warning", lifespan="off"))
+        threading.Thread(target=self._server.run, daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self._server.should_exit = True
+
+
+results = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    results.append(ok)
+    print(f"[{'ok' if ok else 'FALHOU'}] {name}" + (f" ({detail})" if detail else ""))
+
+
+def create_user():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(delete(models.User).where(models.User.email == EMAIL))
+        db.add(models.User(full_name="Check", email=EMAIL, hashed_password="-", credits=CREDITS))
+        db.commit()
+
+
+def user_credits() -> float:
+    with SessionLocal() as db:
+        return float(db.scalar(select(models.User.credits).where(models.User.email == EMAIL)))
+
+
+async def check_client(server: MockLLMServer):
+    client = get_llm_client("openai")
+
+    server.failures = [(500, None), (502, None)]
+    before, retries = server.requests, client.retries
+    text = await client.complete("p")
+    check("5xx é repetido", text == "ok" and server.requests - before == 3 and client.retries - retries == 2,
+          f"{server.requests - before} pedidos")
+
+    server.failures = [(429, 0.3)]
+    before, start = server.requests, time.perf_counter()
+    text = await client.complete("p")
+    elapsed = time.perf_counter() - start
+    check("429 é repetido respeitando Retry-After", text == "ok" and server.requests - before == 2 and elapsed >= 0.3,
+          f"{elapsed:.2f}s")
+
+    server.failures = [(400, None)]
+    before = server.requests
+    try:
+        await client.complete("p")
+        check("4xx não é repetido", False, "sem erro")
+    except openai.BadRequestError:
+        check("4xx não é repetido", server.requests - before == 1 and client.breaker.failures == 0,
+              f"{server.requests - before} pedido, {client.breaker.failures} falhas no breaker")
+
+    server.failures = [(500, None)] * 10
+    before = server.requests
+    try:
+        await client.complete("p")
+        check("breaker abre com falhas seguidas", False, "sem erro")
+    except openai.InternalServerError:
+        check("breaker abre com falhas seguidas", client.breaker.state == OPEN and server.requests - before == 3,
+              f"{server.requests - before} pedidos")
+
+    before, start = server.requests, time.perf_counter()
+    try:
+        await client.complete("p")
+        check("breaker aberto recusa sem chamar o provedor", False, "sem erro")
+    except LLMUnavailableError as e:
+        check("breaker aberto recusa sem chamar o provedor", server.requests == before,
+              f"{(time.perf_counter() - start) * 1000:.1f}ms, retry_after {e.retry_after:.1f}s")
+
+
+async def check_routes():
+    app = FastAPI()
+    app.include_router(courses.router)
+    headers = {"Authorization": f"Bearer {utils.create_access_token({'sub': EMAIL})}"}
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 5000))
+    body = {"topic": "Resiliência", "fresh": True}
+    async with httpx.AsyncClient(transport=transport, base_url="http://check", headers=headers) as client:
+        for path in ("/generate-course", "/generate-course/stream"):
+            response = await client.post(path, json=body)
+            check(f"{path} com breaker aberto: 503 + Retry-After",
+                  response.status_code == 503 and response.headers.get("retry-after") is not None,
+                  f"{response.status_code}, Retry-After {response.headers.get('retry-after')}")
+    check("nenhum crédito debitado", user_credits() == CREDITS, f"{user_credits()} de {CREDITS}")
+
+
+async def check_recovery(server: MockLLMServer):
+    client = get_llm_client("openai")
+    server.failures = []
+    await asyncio.sleep(client.breaker.retry_after() + 0.05)
+    text = await client.complete("p")
+    check("chamada de teste fecha o breaker", text == "ok" and client.breaker.state == CLOSED, client.breaker.state)
+
+
+async def main():
+    create_user()
+    server = MockLLMServer(PORT)
+    server.start()
+    try:
+        await check_client(server)
+        await check_routes()
+        await check_recovery(server)
+    finally:
+        await close_llm_clients()
+        server.stop()
+
+    print(f"{sum(results)}/{len(results)} verificações ok")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,35 @@
+"""add course payloads table
+
+Revision ID: 0a2c4e6b8d1f
+Revises: f1c3a5e7b9d0
+Create Date: 2026-10-18 16:27:03.551871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a2c4e6b8d1f'
+down_revision: Union[str, None] = 'f1c3a5e7b9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'course_payloads',
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('encoding', sa.String(length=16), nullable=False),
+        sa.Column('etag', sa.String(length=66), nullable=True),
+        sa.Column('body', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('course_id', 'encoding')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('course_payloads')
@@ -0,0 +1,37 @@
+"""compress course payloads
+
+Revision ID: 2b4d6f8a0c1e
+Revises: 0a2c4e6b8d1f
+Create Date: 2026-10-18 17:05:44.902317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b4d6f8a0c1e'
+down_revision: Union[str, None] = '0a2c4e6b8d1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Respostas sem compressão são refeitas (comprimidas) na próxima leitura do curso
+    op.execute("DELETE FROM course_payloads WHERE encoding = 'identity'")
+    # ETag com o sufixo da codificação: "<sha256>-gzip" tem 71 caracteres
+    with op.batch_alter_table('course_payloads') as batch_op:
+        batch_op.alter_column('etag', existing_type=sa.String(length=66), type_=sa.String(length=80))
+    if op.get_bind().dialect.name == 'postgresql':
+        # O corpo já vem comprimido: o TOAST guarda fora da linha sem tentar comprimir de novo
+        op.execute("ALTER TABLE course_payloads ALTER COLUMN body SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE course_payloads ALTER COLUMN body SET STORAGE EXTENDED")
+    op.execute("DELETE FROM course_payloads")
+    with op.batch_alter_table('course_payloads') as batch_op:
+        batch_op.alter_column('etag', existing_type=sa.String(length=80), type_=sa.String(length=66))
@@ -0,0 +1,84 @@
+"""move wallpapers to blob store
+
+Revision ID: 3c5e7a9b1d2f
+Revises: 2b4d6f8a0c1e
+Create Date: 2026-10-18 18:12:07.415823
+
+"""
+import base64
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app import blobs
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e7a9b1d2f'
+down_revision: Union[str, None] = '2b4d6f8a0c1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 200
+
+courses = sa.table(
+    'courses',
+    sa.column('id', sa.Integer),
+    sa.column('wallpaper', sa.String),
+)
+course_payloads = sa.table(
+    'course_payloads',
+    sa.column('course_id', sa.Integer),
+)
+
+
+def _rewrite_wallpapers(where, convert) -> None:
+    # Em lotes por id: cada capa em base64 pode ter vários MB
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(courses.c.id, courses.c.wallpaper)
+            .where(courses.c.id > last_id, where)
+            .order_by(courses.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for course_id, wallpaper in rows:
+            value = convert(wallpaper)
+            if value != wallpaper:
+                bind.execute(courses.update().where(courses.c.id == course_id).values(wallpaper=value))
+                # A resposta pré-serializada ainda traz a capa antiga; é refeita na próxima leitura
+                bind.execute(course_payloads.delete().where(course_payloads.c.course_id == course_id))
+        last_id = rows[-1].id
+
+
+def _data_uri(wallpaper: str) -> str:
+    name = blobs.wallpaper_blob(wallpaper)
+    path = blobs.blob_store.get_path(name)
+    if path is None:
+        return wallpaper
+    with open(path, 'rb') as file:
+        data = base64.b64encode(file.read()).decode('ascii')
+    return f"data:{blobs.media_type(name)};base64,{data}"
+
+
+def upgrade() -> None:
+    if context.is_offline_mode():
+        # Os arquivos são gravados a partir dos dados: rode esta revisão online
+        op.execute("-- move wallpapers to blob store: requires online migration")
+        return
+    _rewrite_wallpapers(
+        sa.func.length(courses.c.wallpaper) >= blobs.MIN_BASE64_LENGTH,
+        blobs.store_wallpaper
+    )
+
+
+def downgrade() -> None:
+    if context.is_offline_mode():
+        op.execute("-- restore wallpapers from blob store: requires online migration")
+        return
+    # Os arquivos ficam no blob store; só as referências voltam a ser a imagem
+    _rewrite_wallpapers(courses.c.wallpaper.like(blobs.BLOB_REF_PREFIX + '%'), _data_uri)
@@ -0,0 +1,26 @@
+"""add plan column to users
+
+Revision ID: 4d6f8a0c2e1b
+Revises: 3c5e7a9b1d2f
+Create Date: 2026-10-18 19:05:41.237904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d6f8a0c2e1b'
+down_revision: Union[str, None] = '3c5e7a9b1d2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('plan', sa.String(length=20), server_default='free', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'plan')
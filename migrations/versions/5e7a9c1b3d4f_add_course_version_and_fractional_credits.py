@@ -0,0 +1,40 @@
+"""add course version and fractional credits
+
+Revision ID: 5e7a9c1b3d4f
+Revises: 4d6f8a0c2e1b
+Create Date: 2026-10-18 20:32:16.508127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a9c1b3d4f'
+down_revision: Union[str, None] = '4d6f8a0c2e1b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('courses', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('credits', existing_type=sa.Integer(), type_=sa.Numeric(10, 2))
+    with op.batch_alter_table('credit_reservations') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Integer(), type_=sa.Numeric(10, 2))
+    # As respostas pré-serializadas ainda não têm "version"; são refeitas na próxima leitura
+    op.execute('DELETE FROM course_payloads')
+
+
+def downgrade() -> None:
+    # Frações de crédito são arredondadas para baixo
+    with op.batch_alter_table('credit_reservations') as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.Numeric(10, 2), type_=sa.Integer(),
+                              postgresql_using='floor(amount)::integer')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('credits', existing_type=sa.Numeric(10, 2), type_=sa.Integer(),
+                              postgresql_using='floor(credits)::integer')
+    op.drop_column('courses', 'version')
+    op.execute('DELETE FROM course_payloads')
@@ -0,0 +1,26 @@
+"""add kind to generation jobs
+
+Revision ID: 6f8b0d2e4a5c
+Revises: 5e7a9c1b3d4f
+Create Date: 2026-10-18 21:47:09.362518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f8b0d2e4a5c'
+down_revision: Union[str, None] = '5e7a9c1b3d4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('generation_jobs', sa.Column('kind', sa.String(length=20), server_default='course', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('generation_jobs', 'kind')
@@ -0,0 +1,43 @@
+"""add idempotency key to generation jobs and generation leases table
+
+Revision ID: 7a1d3e5f2c84
+Revises: 4c2e8f1a9b3d
+Create Date: 2026-10-18 11:40:02.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1d3e5f2c84'
+down_revision: Union[str, None] = '4c2e8f1a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('generation_jobs', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.add_column('generation_jobs', sa.Column('request_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_generation_jobs_request_hash'), 'generation_jobs', ['request_hash'], unique=False)
+    op.create_unique_constraint(
+        'uq_generation_jobs_user_idempotency_key', 'generation_jobs', ['user_id', 'idempotency_key']
+    )
+    op.create_table(
+        'generation_leases',
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('job_id', sa.String(length=32), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['generation_jobs.id'], ),
+        sa.PrimaryKeyConstraint('request_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('generation_leases')
+    op.drop_constraint('uq_generation_jobs_user_idempotency_key', 'generation_jobs', type_='unique')
+    op.drop_index(op.f('ix_generation_jobs_request_hash'), table_name='generation_jobs')
+    op.drop_column('generation_jobs', 'request_hash')
+    op.drop_column('generation_jobs', 'idempotency_key')
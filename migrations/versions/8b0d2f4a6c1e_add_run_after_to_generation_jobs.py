@@ -0,0 +1,26 @@
+"""add run_after to generation jobs
+
+Revision ID: 8b0d2f4a6c1e
+Revises: 6f8b0d2e4a5c
+Create Date: 2026-10-18 23:12:41.508317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b0d2f4a6c1e'
+down_revision: Union[str, None] = '6f8b0d2e4a5c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('generation_jobs', sa.Column('run_after', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('generation_jobs', 'run_after')
@@ -0,0 +1,35 @@
+"""refresh course payloads with signed wallpaper urls
+
+Revision ID: 9c1e3a5b7d2f
+Revises: 8b0d2f4a6c1e
+Create Date: 2026-10-19 10:04:52.117390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1e3a5b7d2f'
+down_revision: Union[str, None] = '8b0d2f4a6c1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _drop_wallpaper_payloads() -> None:
+    # Respostas pré-serializadas com a URL da capa no formato anterior;
+    # são refeitas na próxima leitura (ensure_course_payloads)
+    op.execute(
+        "DELETE FROM course_payloads WHERE course_id IN "
+        "(SELECT id FROM courses WHERE wallpaper LIKE 'blob:%')"
+    )
+
+
+def upgrade() -> None:
+    _drop_wallpaper_payloads()
+
+
+def downgrade() -> None:
+    _drop_wallpaper_payloads()
@@ -0,0 +1,49 @@
+"""add credit reservations table
+
+Revision ID: b93e4d7c1a26
+Revises: 7a1d3e5f2c84
+Create Date: 2026-10-18 12:21:47.903512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b93e4d7c1a26'
+down_revision: Union[str, None] = '7a1d3e5f2c84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'credit_reservations',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('job_id', sa.String(length=32), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_credit_reservations_user_id'), 'credit_reservations', ['user_id'], unique=False)
+    op.create_index(op.f('ix_credit_reservations_status'), 'credit_reservations', ['status'], unique=False)
+    op.create_index(op.f('ix_credit_reservations_expires_at'), 'credit_reservations', ['expires_at'], unique=False)
+    op.add_column('generation_jobs', sa.Column('reservation_id', sa.String(length=32), nullable=True))
+    op.create_foreign_key(
+        'fk_generation_jobs_reservation_id', 'generation_jobs', 'credit_reservations', ['reservation_id'], ['id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('fk_generation_jobs_reservation_id', 'generation_jobs', type_='foreignkey')
+    op.drop_column('generation_jobs', 'reservation_id')
+    op.drop_index(op.f('ix_credit_reservations_expires_at'), table_name='credit_reservations')
+    op.drop_index(op.f('ix_credit_reservations_status'), table_name='credit_reservations')
+    op.drop_index(op.f('ix_credit_reservations_user_id'), table_name='credit_reservations')
+    op.drop_table('credit_reservations')
@@ -0,0 +1,67 @@
+"""add normalized course content tables
+
+Revision ID: e5b7c9d1f3a2
+Revises: b93e4d7c1a26
+Create Date: 2026-10-18 15:02:11.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b7c9d1f3a2'
+down_revision: Union[str, None] = 'b93e4d7c1a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'course_modules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('module_title', sa.String(), nullable=True),
+        sa.Column('chapter', sa.String(), nullable=True),
+        sa.Column('practice_activities', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('course_id', 'position', name='uq_course_modules_course_position')
+    )
+    op.create_index(op.f('ix_course_modules_id'), 'course_modules', ['id'], unique=False)
+    op.create_table(
+        'course_lessons',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('module_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('lesson_title', sa.String(), nullable=True),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['module_id'], ['course_modules.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('module_id', 'position', name='uq_course_lessons_module_position')
+    )
+    op.create_index(op.f('ix_course_lessons_id'), 'course_lessons', ['id'], unique=False)
+    op.create_table(
+        'course_quiz_questions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('course_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('alternatives', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['course_id'], ['courses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('course_id', 'position', name='uq_course_quiz_questions_course_position')
+    )
+    op.create_index(op.f('ix_course_quiz_questions_id'), 'course_quiz_questions', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_course_quiz_questions_id'), table_name='course_quiz_questions')
+    op.drop_table('course_quiz_questions')
+    op.drop_index(op.f('ix_course_lessons_id'), table_name='course_lessons')
+    op.drop_table('course_lessons')
+    op.drop_index(op.f('ix_course_modules_id'), table_name='course_modules')
+    op.drop_table('course_modules')
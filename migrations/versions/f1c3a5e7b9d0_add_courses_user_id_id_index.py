@@ -0,0 +1,26 @@
+"""add courses (user_id, id) index
+
+Revision ID: f1c3a5e7b9d0
+Revises: e5b7c9d1f3a2
+Create Date: 2026-10-18 15:48:36.210954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a5e7b9d0'
+down_revision: Union[str, None] = 'e5b7c9d1f3a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_courses_user_id_id', 'courses', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_courses_user_id_id', table_name='courses')
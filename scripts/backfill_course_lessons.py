@@ -0,0 +1,54 @@
+"""
+Backfill das tabelas normalizadas de conteúdo (course_modules, course_lessons,
+course_quiz_questions) para cursos criados antes delas.
+
+Processa em lotes por id e pula cursos que já têm módulos normalizados,
+então pode ser interrompido e executado de novo.
+
+Uso (depois de `alembic upgrade head`):
+    python -m scripts.backfill_course_lessons --batch-size 100
+"""
+import argparse
+from sqlalchemy import select, exists
+from app import models
+from app.database import SessionLocal
+from app.generation import normalize_course
+
+
+def backfill(batch_size: int) -> int:
+    last_id = 0
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            courses = db.execute(
+                select(models.Course)
+                .where(
+                    models.Course.id > last_id,
+                    ~exists().where(models.CourseModule.course_id == models.Course.id)
+                )
+                .order_by(models.Course.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not courses:
+                return total
+
+            for course in courses:
+                normalize_course(course)
+            db.commit()
+
+            last_id = courses[-1].id
+            total += len(courses)
+            print(f"{total} cursos normalizados (último id {last_id})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    total = backfill(args.batch_size)
+    print(f"Concluído: {total} cursos normalizados")
+
+
+if __name__ == "__main__":
+    main()